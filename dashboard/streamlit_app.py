@@ -1,3 +1,4 @@
+import functools
 import os
 import sys
 sys.path.insert(
@@ -5,200 +6,658 @@ sys.path.insert(
     os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 )
 import streamlit as st
+import numpy as np
 import pandas as pd
 from scripts.database import get_engine
-from scripts.filters import apply_filters
-from scripts import kpi_calculations
-from scripts.data_loading import load_sales_data, load_customer_data, load_product_data, load_marketing_data
-from scripts.charts import (
-    monthly_sales_trend_chart,
-    campaign_spend_vs_conversions,
-    customer_segments_pie,
-    product_revenue_bar,
-    product_quantity_bar,
-    sales_growth_over_time_chart
+from scripts.filters import apply_filters, filter_mask
+from scripts.data_loading import (
+    load_sales_data,
+    load_customer_data,
+    load_product_data,
+    load_marketing_data,
+    load_campaign_performance,
+    load_sales_sketches,
+    load_sales_sample,
+    load_cohort_activity,
+    load_cohort_sizes,
+    load_kpi_cube,
+    load_anomalies
 )
-from scripts.predictive_analysis import get_monthly_sales_prediction
 
-engine = get_engine()
+# Heavy modules (plotly via scripts.charts, sklearn via scripts.predictive_analysis,
+# SQLAlchemy helpers) are imported inside the page that uses them, and no database
+# connection is opened until a page runs its first query, so cold start only pays
+# for what the first page needs.
+
+# Cached results are refreshed at most this often (seconds)
+CACHE_TTL = 600
+
+# Days of anomalies shown when no date range is selected
+ANOMALY_LOOKBACK_DAYS = 30
+
+PAGES = ["Home", "Reports", "KPIs", "Cohorts", "Predictive Analysis"]
+
+FILTER_KEYS = ["start_date", "end_date", "products", "segments", "campaigns", "approximate_mode"]
+
 st.set_page_config(layout="wide")
 st.title("E-commerce BI Dashboard")
 
-def get_base_data():
+def get_shared_snapshot():
+    """
+    The host-wide memory-mapped snapshot (scripts.data_snapshot): its 'version' and
+    base 'tables'. The tables are shared by every session, so callers must not
+    modify them in place. Returns None when no snapshot can be built, e.g. pyarrow is missing.
+    """
+    try:
+        from scripts.data_snapshot import get_snapshot
+        return get_snapshot(get_engine())
+    except Exception as e:
+        print(f"Data snapshot unavailable, loading tables directly: {e}")
+        return None
+
+def requires_tables(*tables):
+    """
+    Makes a cached getter return None while any of its tables is missing (they are
+    created by the pipeline scripts). The check runs on every call and its result is
+    not cached, so a page updates as soon as the script has run; other errors,
+    e.g. a failed connection, are raised.
+    """
+    def decorator(getter):
+        @functools.wraps(getter)
+        def wrapper(*args, **kwargs):
+            from sqlalchemy import inspect
+            inspector = inspect(get_engine())
+            if not all(inspector.has_table(table) for table in tables):
+                return None
+            return getter(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_base_data():
     customers = load_customer_data()
     products = load_product_data()
     marketing = load_marketing_data()
     return customers, products, marketing
 
-customers, products, marketing = get_base_data()
+@st.cache_data(ttl=CACHE_TTL)
+def load_sales_table():
+    return load_sales_data()
+
+def get_base_data():
+    snapshot = get_shared_snapshot()
+    if snapshot is None:
+        return load_base_data()
+    tables = snapshot['tables']
+    return tables['customers'], tables['products'], tables['marketing']
+
+def get_sales_data():
+    snapshot = get_shared_snapshot()
+    if snapshot is None:
+        return load_sales_table()
+    return snapshot['tables']['sales']
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=256)
+def get_filtered_rows(data_version, start_date, end_date, selected_products, selected_segments, selected_campaigns,
+                      _tables):
+    """
+    Read-only positions of the snapshot's sales rows matching the filters (None: all rows).
+    One entry per data version and filters serves every session, and holds no copy of the rows.
+    """
+    mask = filter_mask(_tables['sales'], _tables['products'], _tables['customers'], _tables['marketing'],
+                       start_date, end_date, list(selected_products),
+                       list(selected_segments), list(selected_campaigns))
+    if mask is None:
+        return None
+    rows = np.flatnonzero(mask)
+    rows.flags.writeable = False
+    return rows
+
+def get_filtered_sales(start_date, end_date, selected_products, selected_segments, selected_campaigns):
+    """
+    Filtered sales for this run; must not be modified in place. Without filters this
+    is the shared sales table itself, otherwise a copy of the matching rows that is
+    released after the run rather than kept per session.
+    """
+    filters = (start_date, end_date, selected_products, selected_segments, selected_campaigns)
+    snapshot = get_shared_snapshot()
+    if snapshot is None:
+        customers, products, marketing = load_base_data()
+        return apply_filters(load_sales_table(), products, customers, marketing, start_date, end_date,
+                             list(selected_products), list(selected_segments), list(selected_campaigns))
+    rows = get_filtered_rows(snapshot['version'], *filters, _tables=snapshot['tables'])
+    sales = snapshot['tables']['sales']
+    return sales if rows is None else sales.take(rows)
+
+@st.cache_data(ttl=CACHE_TTL)
+def get_kpis():
+    from scripts import kpi_calculations
+    return kpi_calculations.calculate_all_kpis(get_engine())
+
+@st.cache_data(ttl=CACHE_TTL)
+def get_sales_growth_data():
+    sales_growth_data = pd.read_sql("""
+        SELECT
+            EXTRACT(YEAR FROM order_date) AS year,
+            EXTRACT(MONTH FROM order_date) AS month,
+            SUM(total_price) AS monthly_sales
+        FROM sales
+        GROUP BY EXTRACT(YEAR FROM order_date), EXTRACT(MONTH FROM order_date)
+        ORDER BY EXTRACT(YEAR FROM order_date), EXTRACT(MONTH FROM order_date)
+    """, get_engine())
+    sales_growth_data['year_month'] = (
+        sales_growth_data['year'].astype(int).astype(str) + "-" +
+        sales_growth_data['month'].astype(int).astype(str).str.zfill(2)
+    )
+    return sales_growth_data
+
+@st.cache_data(ttl=CACHE_TTL)
+def get_prediction():
+    from scripts.predictive_analysis import get_monthly_sales_prediction
+    return get_monthly_sales_prediction(get_engine())
+
+@requires_tables('campaign_performance')
+@st.cache_data(ttl=CACHE_TTL)
+def get_campaign_performance(attribution_model):
+    return load_campaign_performance(attribution_model)
+
+@requires_tables('sales_sketches', 'sales_sample')
+@st.cache_data(ttl=CACHE_TTL)
+def get_sales_sketches():
+    return load_sales_sketches(), load_sales_sample()
+
+@requires_tables('cohort_activity')
+@st.cache_data(ttl=CACHE_TTL)
+def get_cohort_matrix(metric):
+    from scripts.cohort_analysis import cohort_matrix
+    return cohort_matrix(load_cohort_activity(), load_cohort_sizes(), metric)
+
+@requires_tables('kpi_cube')
+@st.cache_data(ttl=CACHE_TTL)
+def get_kpi_cube():
+    from scripts.kpi_cube import index_cube
+    return index_cube(load_kpi_cube())
+
+@requires_tables('anomalies')
+@st.cache_data(ttl=CACHE_TTL)
+def get_anomalies():
+    return load_anomalies()
+
+@st.cache_data(ttl=CACHE_TTL)
+def get_approximate_kpis():
+    from scripts.approximate_queries import calculate_approximate_kpis
+    sketches, sample = get_sales_sketches()
+    return calculate_approximate_kpis(get_engine(), sketches, sample)
 
-product_options = ['All'] + products['product_name'].unique().tolist()
-segment_options = ['All'] + customers['segment'].unique().tolist()
-campaign_options = ['All'] + marketing['campaign_name'].unique().tolist()
+# Only the selected page runs, unlike st.tabs which executes every tab on each rerun
+page = st.radio("Page", PAGES, horizontal=True, label_visibility="collapsed", key="page")
 
-tabs = st.tabs(["Home", "Reports", "KPIs", "Predictive Analysis"])
+# Sidebar widgets are only drawn on the pages that use them; re-assigning their
+# state keeps the selections while another page is shown
+for key in FILTER_KEYS:
+    if key in st.session_state:
+        st.session_state[key] = st.session_state[key]
 
-with tabs[0]:
+
+def reset_exact_results():
+    # "Show exact results" only holds until approximate mode or the filters change
+    st.session_state.pop("exact_kpis", None)
+    st.session_state.pop("exact_reports", None)
+
+
+def render_approximate_toggle():
+    return st.sidebar.toggle(
+        "Approximate mode", key="approximate_mode", on_change=reset_exact_results,
+        help="Answer from pre-built sketches and a stratified sample, with 95% error bounds. Exact results on demand."
+    )
+
+
+def render_sidebar_filters():
+    customers, products, marketing = get_base_data()
+    product_options = ['All'] + products['product_name'].unique().tolist()
+    segment_options = ['All'] + customers['segment'].unique().tolist()
+    campaign_options = ['All'] + marketing['campaign_name'].unique().tolist()
+
+    st.sidebar.header("Filters")
+    start_date = st.sidebar.date_input("Start Date", value=None, key="start_date", on_change=reset_exact_results)
+    end_date = st.sidebar.date_input("End Date", value=None, key="end_date", on_change=reset_exact_results)
+    selected_products = st.sidebar.multiselect("Select Product(s)", product_options, default=['All'], key="products",
+                                               on_change=reset_exact_results)
+    selected_segments = st.sidebar.multiselect("Select Customer Segment(s)", segment_options, default=['All'],
+                                               key="segments", on_change=reset_exact_results)
+    selected_campaigns = st.sidebar.multiselect("Select Marketing Campaign(s)", campaign_options, default=['All'],
+                                                key="campaigns", on_change=reset_exact_results)
+    return (start_date, end_date, tuple(selected_products),
+            tuple(selected_segments), tuple(selected_campaigns))
+
+
+def render_home():
     st.header("Welcome to the E-commerce BI Dashboard!")
     st.write("This dashboard provides key insights from our e-commerce data.")
 
-# Reports Page
-with tabs[1]:
-    st.header("Sales Trends and Customer Segments")
 
-    # Sidebar filters
-    st.sidebar.header("Filters")
-    start_date = st.sidebar.date_input("Start Date", value=None)
-    end_date = st.sidebar.date_input("End Date", value=None)
-    selected_products = st.sidebar.multiselect("Select Product(s)", product_options, default=['All'])
-    selected_segments = st.sidebar.multiselect("Select Customer Segment(s)", segment_options, default=['All'])
-    selected_campaigns = st.sidebar.multiselect("Select Marketing Campaign(s)", campaign_options, default=['All'])
+def get_drill_down_filters(filters_signature):
+    start_date, end_date, selected_products, selected_segments, selected_campaigns = filters_signature
+    _, products, _ = get_base_data()
+    filters = {'start_date': start_date, 'end_date': end_date}
+    if 'All' not in selected_products:
+        filters['product_ids'] = products[products['product_name'].isin(selected_products)]['product_id'].tolist()
+    if 'All' not in selected_segments:
+        filters['segments'] = list(selected_segments)
+    if 'All' not in selected_campaigns:
+        filters['campaigns'] = list(selected_campaigns)
+    return filters
+
+
+def paginated_campaign_sales(campaign_name, filters):
+    from scripts.drill_down import (
+        SORT_ORDERS,
+        PAGE_SIZES,
+        fetch_campaign_sales_page,
+        estimate_campaign_sales_count
+    )
+
+    # Only the visible page is fetched; cursors of visited pages are kept so "Previous" is a lookup
+    controls = st.columns(2)
+    sort_label = controls[0].selectbox("Sort by order date", list(SORT_ORDERS), key="drill_sort")
+    page_size = controls[1].selectbox("Rows per page", PAGE_SIZES, index=1, key="drill_page_size")
+
+    signature = (campaign_name, sort_label, page_size, repr(sorted(filters.items())))
+    if st.session_state.get("drill_signature") != signature:
+        st.session_state["drill_signature"] = signature
+        st.session_state["drill_cursors"] = [None]
+        st.session_state["drill_page"] = 0
+
+    cursors = st.session_state["drill_cursors"]
+    page_number = st.session_state["drill_page"]
+    engine = get_engine()
+    page_df, next_cursor = fetch_campaign_sales_page(
+        engine, campaign_name, after=cursors[page_number],
+        sort_order=SORT_ORDERS[sort_label], page_size=page_size, **filters
+    )
+    estimated_total = estimate_campaign_sales_count(engine, campaign_name, **filters)
+
+    st.dataframe(page_df, use_container_width=True, hide_index=True)
+
+    nav = st.columns([1, 2, 1])
+    if nav[0].button("Previous", disabled=page_number == 0, key="drill_prev"):
+        st.session_state["drill_page"] = page_number - 1
+        st.rerun(scope="fragment")
+    nav[1].caption(f"Page {page_number + 1} of ~{max(1, -(-estimated_total // page_size))} "
+                   f"(~{estimated_total:,} orders)")
+    if nav[2].button("Next", disabled=next_cursor is None, key="drill_next"):
+        if len(cursors) == page_number + 1:
+            cursors.append(next_cursor)
+        st.session_state["drill_page"] = page_number + 1
+        st.rerun(scope="fragment")
+
+
+@st.fragment
+def campaign_drill_down(filters):
+    # Runs as a fragment: changing the selected campaign or page reruns only this block
+    _, _, marketing = get_base_data()
+    selected_campaign_seg = st.selectbox(
+        "Select a Campaign for Segmentation Insights",
+        options=marketing['campaign_name'].unique(),
+        key="drill_campaign"
+    )
+    if selected_campaign_seg:
+        campaign_details_seg = marketing[marketing['campaign_name'] == selected_campaign_seg]
+        st.write("#### Campaign Details")
+        st.write(campaign_details_seg)
+        st.write("#### Sales Related to Selected Campaign")
+        paginated_campaign_sales(selected_campaign_seg, filters)
+
+
+@st.fragment
+def recent_anomalies(start_date, end_date):
+    st.subheader("Anomalies")
+    anomalies = get_anomalies()
+    if anomalies is None:
+        st.info("Anomalies have not been computed yet. Run scripts/anomaly_detection.py.")
+        return
+    if start_date and end_date:
+        anomalies = anomalies[anomalies['day'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))]
+        st.caption(f"Days with unusual revenue or orders between {start_date} and {end_date}.")
+    elif not anomalies.empty:
+        since = anomalies['day'].max() - pd.Timedelta(days=ANOMALY_LOOKBACK_DAYS - 1)
+        anomalies = anomalies[anomalies['day'] >= since]
+        st.caption(f"Days with unusual revenue or orders in the last {ANOMALY_LOOKBACK_DAYS} days of data.")
+
+    dimension = st.selectbox("Series", ["All", "product", "segment", "campaign"],
+                             format_func=str.title, key="anomaly_dimension")
+    if dimension != "All":
+        anomalies = anomalies[anomalies['dimension'] == dimension]
+    if anomalies.empty:
+        st.write("No anomalies flagged.")
+        return
+
+    anomaly_columns = st.columns(2)
+    anomaly_columns[0].metric("Drops", int((anomalies['direction'] == 'drop').sum()))
+    anomaly_columns[1].metric("Spikes", int((anomalies['direction'] == 'spike').sum()))
+    st.dataframe(
+        anomalies.assign(day=anomalies['day'].dt.date).round({'value': 2, 'baseline': 2, 'z_score': 2}),
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+@st.fragment
+def campaign_roi_analysis():
+    from scripts.campaign_attribution import ATTRIBUTION_MODELS
+    from scripts.charts import campaign_spend_vs_conversions
+
+    _, _, marketing = get_base_data()
+    st.header("Campaign ROI Analysis")
+    attribution_model = st.selectbox(
+        "Attribution Model",
+        options=ATTRIBUTION_MODELS,
+        format_func=lambda model: model.replace('_', ' ').title()
+    )
+    campaign_performance = get_campaign_performance(attribution_model)
+    campaign_data = marketing
+    if campaign_performance is None:
+        st.info("Campaign attribution has not been computed yet. Run scripts/campaign_attribution.py.")
+    else:
+        attributed = campaign_performance[['campaign_id', 'attributed_revenue', 'attributed_orders',
+                                           'unique_customers', 'ROAS']]
+        campaign_data = marketing.merge(attributed, on='campaign_id', how='left')
 
+    st.subheader("Campaign Spend vs. Conversions")
+    fig_roi_analysis = campaign_spend_vs_conversions(campaign_data)
+    st.plotly_chart(fig_roi_analysis, use_container_width=True, key="roi_analysis_chart_2")
+    if campaign_performance is not None:
+        st.dataframe(
+            campaign_performance[['campaign_name', 'spend', 'attributed_revenue', 'attributed_orders',
+                                  'unique_customers', 'ROAS']].sort_values('attributed_revenue', ascending=False),
+            use_container_width=True, hide_index=True
+        )
+
+
+def render_approximate_metrics(filters_signature):
+    """
+    Shows sketch/sample estimates for the filtered metrics and returns the
+    weighted sample rows used to draw the charts, or None if the approximate
+    tables are not available.
+    """
+    from scripts.approximate_queries import (
+        filter_sketches,
+        estimate_distinct,
+        estimate_order_value_quantiles,
+        estimate_sales_metrics,
+        weighted_sample
+    )
+
+    approximate_data = get_sales_sketches()
+    if approximate_data is None:
+        st.info("Approximate mode is unavailable until scripts/approximate_queries.py has run.")
+        return None
+    sketches, sample = approximate_data
+    customers, products, marketing = get_base_data()
+    start_date, end_date, selected_products, selected_segments, selected_campaigns = filters_signature
+
+    filters = get_drill_down_filters(filters_signature)
+    campaign_windows = None
+    if 'campaigns' in filters:
+        selected = marketing[marketing['campaign_name'].isin(filters['campaigns'])]
+        campaign_windows = list(zip(selected['start_date'], selected['end_date']))
+    sketch_rows = filter_sketches(sketches, start_date, end_date, filters.get('product_ids'),
+                                  filters.get('segments'), campaign_windows)
+    filtered_sample = apply_filters(sample, products, customers, marketing, start_date, end_date,
+                                    list(selected_products), list(selected_segments), list(selected_campaigns))
+    if sketch_rows.empty or filtered_sample.empty:
+        return filtered_sample.iloc[0:0]
+
+    estimates = estimate_sales_metrics(sample, pd.Series(sample.index.isin(filtered_sample.index), index=sample.index))
+    total_orders, total_orders_error = estimate_distinct(sketch_rows, 'orders_hll')
+    quantiles = estimate_order_value_quantiles(sketch_rows, (0.5, 0.9))
+
+    st.subheader("Filtered Sales Metrics (approximate)")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Sales ($)", f"≈${estimates['total_sales']:,.2f}",
+                help=f"±${estimates['total_sales_error']:,.2f} (95%)")
+    col2.metric("Total Orders", f"≈{total_orders:,.0f}", help=f"±{total_orders_error:,.0f} (95%)")
+    col3.metric("Average Order Value (AOV)", f"≈${estimates['aov']:,.2f}",
+                help=f"±${estimates['aov_error']:,.2f} (95%)")
+    quantile_columns = st.columns(3)
+    quantile_columns[0].metric("Median Order Value", f"≈${quantiles[0.5]:,.2f}")
+    quantile_columns[1].metric("90th Percentile Order Value", f"≈${quantiles[0.9]:,.2f}")
+    if quantile_columns[2].button("Show exact results", key="exact_reports_button"):
+        st.session_state["exact_reports"] = filters_signature
+        st.rerun()
+
+    return weighted_sample(filtered_sample)
+
+
+def render_reports():
+    from scripts.charts import (
+        monthly_sales_trend_chart,
+        campaign_spend_vs_conversions,
+        customer_segments_pie,
+        product_revenue_bar,
+        product_quantity_bar
+    )
+    from scripts.kpi_calculations import calculate_sales_summary, calculate_product_performance
+
+    st.header("Sales Trends and Customer Segments")
+
+    filters_signature = render_sidebar_filters()
+    approximate_mode = render_approximate_toggle()
+    start_date, end_date = filters_signature[:2]
     if start_date and end_date and start_date > end_date:
         st.sidebar.error("Error: Start Date must be before End Date.")
-    else:
-        all_sales = load_sales_data()  # Load all sales first
-        filtered_sales = apply_filters(all_sales, products, customers, marketing,
-                                       start_date, end_date, selected_products, selected_segments, selected_campaigns)
+        return
+
+    customers, products, marketing = get_base_data()
+    filtered_sales = None
+    if approximate_mode and st.session_state.get("exact_reports") != filters_signature:
+        filtered_sales = render_approximate_metrics(filters_signature)
+        if filtered_sales is not None and filtered_sales.empty:
+            st.warning("No data available for the selected filters.")
+            return
+
+    if filtered_sales is None:
+        filtered_sales = get_filtered_sales(*filters_signature)
 
         if filtered_sales.empty:
             st.warning("No data available for the selected filters.")
-        else:
-            # Display filtered metrics
-            st.subheader("Filtered Sales Metrics")
-            total_sales = filtered_sales['total_price'].sum()
-            total_orders = filtered_sales['order_id'].nunique()
-            average_order_value = filtered_sales['total_price'].mean()
-
-            col1, col2, col3 = st.columns(3)
-            col1.metric("Total Sales ($)", f"${total_sales:,.2f}")
-            col2.metric("Total Orders", f"{total_orders}")
-            col3.metric("Average Order Value (AOV)", f"${average_order_value:,.2f}")
-
-            # Monthly Sales Trends
-            report_columns = st.columns(2)
-            with report_columns[0]:
-                st.subheader("Monthly Sales Trends")
-                fig_sales = monthly_sales_trend_chart(filtered_sales, start_date, end_date)
-                st.plotly_chart(fig_sales, use_container_width=True, key="sales_trend_chart")
-
-            with report_columns[1]:
-                st.subheader("Campaign Spend vs. Conversions")
-                fig_roi = campaign_spend_vs_conversions(marketing)
-                st.plotly_chart(fig_roi, use_container_width=True, key="roi_chart_1")
-
-            # Customer Segmentation
-            st.header("Customer Segmentation")
-            st.write("Customer Segments: Premium, Standard, Basic")
-
-            segment_distribution = customers['segment'].value_counts().reset_index()
-            segment_distribution.columns = ['Segment', 'Count']
-
-            segmentation_columns = st.columns(2)
-            with segmentation_columns[0]:
-                st.subheader("Customer Segments Distribution")
-                fig_segments = customer_segments_pie(segment_distribution)
-                st.plotly_chart(fig_segments, use_container_width=True)
-
-            with segmentation_columns[1]:
-                st.subheader("Drill-Down: Campaign Details")
-                selected_campaign_seg = st.selectbox(
-                    "Select a Campaign for Segmentation Insights",
-                    options=marketing['campaign_name'].unique()
-                )
-                if selected_campaign_seg:
-                    campaign_details_seg = marketing[marketing['campaign_name'] == selected_campaign_seg]
-                    st.write("#### Campaign Details")
-                    st.write(campaign_details_seg)
-                    try:
-                        sales_marketing = pd.read_csv("data/cleaned/sales_marketing.csv")
-                        related_order_ids_seg = sales_marketing[sales_marketing['campaign_name'] == selected_campaign_seg]['order_id']
-                        related_sales_seg = filtered_sales[filtered_sales['order_id'].isin(related_order_ids_seg)]
-                        st.write("#### Sales Related to Selected Campaign")
-                        st.write(related_sales_seg)
-                    except FileNotFoundError:
-                        st.warning("Sales-Marketing mapping file not found. Drill-down for campaigns is disabled.")
-
-            # Product Performance
-            st.header("Product Performance")
-            st.write("Product Performance by Revenue and Quantity Sold")
-
-            sales_with_products = filtered_sales.merge(products, on='product_id')
-            product_performance = sales_with_products.groupby('product_name').agg(
-                total_revenue=('total_price', 'sum'),
-                total_quantity=('quantity', 'sum')
-            ).reset_index()
-
-            performance_columns = st.columns(2)
-            with performance_columns[0]:
-                st.subheader("Product Revenue")
-                fig_revenue = product_revenue_bar(product_performance)
-                st.plotly_chart(fig_revenue, use_container_width=True)
-
-            with performance_columns[1]:
-                st.subheader("Product Quantity Sold")
-                fig_quantity = product_quantity_bar(product_performance)
-                st.plotly_chart(fig_quantity, use_container_width=True)
-
-            # Campaign ROI Analysis
-            st.header("Campaign ROI Analysis")
-            st.subheader("Campaign Spend vs. Conversions")
-            fig_roi_analysis = campaign_spend_vs_conversions(marketing)
-            st.plotly_chart(fig_roi_analysis, use_container_width=True, key="roi_analysis_chart_2")
-
-            # # Campaign Drill-Down Reports
-            # st.header("Campaign Drill-Down Reports")
-            # selected_campaign_drill = st.selectbox(
-            #     "Select a Campaign for Detailed Insights",
-            #     options=marketing['campaign_name'].unique()
-            # )
-            # if selected_campaign_drill:
-            #     campaign_details_drill = marketing[marketing['campaign_name'] == selected_campaign_drill]
-            #     st.write("#### Campaign Details")
-            #     st.write(campaign_details_drill)
-            #     try:
-            #         sales_marketing = pd.read_csv("data/cleaned/sales_marketing.csv")
-            #         related_order_ids_drill = sales_marketing[sales_marketing['campaign_name'] == selected_campaign_drill]['order_id']
-            #         related_sales_drill = filtered_sales[filtered_sales['order_id'].isin(related_order_ids_drill)]
-            #         st.write("#### Sales Related to Selected Campaign")
-            #         st.write(related_sales_drill)
-            #     except FileNotFoundError:
-            #         st.warning("Sales-Marketing mapping file not found. Drill-down for campaigns is disabled.")
-
-# KPIs Page
-with tabs[2]:
+            return
+
+        # Display filtered metrics
+        st.subheader("Filtered Sales Metrics")
+        summary = calculate_sales_summary(filtered_sales)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Sales ($)", f"${summary['Total Sales ($)']:,.2f}")
+        col2.metric("Total Orders", f"{summary['Total Orders']}")
+        col3.metric("Average Order Value (AOV)", f"${summary['Average Order Value (AOV)']:,.2f}")
+
+    # Monthly Sales Trends
+    report_columns = st.columns(2)
+    with report_columns[0]:
+        st.subheader("Monthly Sales Trends")
+        fig_sales = monthly_sales_trend_chart(filtered_sales, start_date, end_date)
+        st.plotly_chart(fig_sales, use_container_width=True, key="sales_trend_chart")
+
+    with report_columns[1]:
+        st.subheader("Campaign Spend vs. Conversions")
+        fig_roi = campaign_spend_vs_conversions(marketing)
+        st.plotly_chart(fig_roi, use_container_width=True, key="roi_chart_1")
+
+    recent_anomalies(start_date, end_date)
+
+    # Customer Segmentation
+    st.header("Customer Segmentation")
+    st.write("Customer Segments: Premium, Standard, Basic")
+
+    segment_distribution = customers['segment'].value_counts().reset_index()
+    segment_distribution.columns = ['Segment', 'Count']
+
+    segmentation_columns = st.columns(2)
+    with segmentation_columns[0]:
+        st.subheader("Customer Segments Distribution")
+        fig_segments = customer_segments_pie(segment_distribution)
+        st.plotly_chart(fig_segments, use_container_width=True)
+
+    with segmentation_columns[1]:
+        st.subheader("Drill-Down: Campaign Details")
+        campaign_drill_down(get_drill_down_filters(filters_signature))
+
+    # Product Performance
+    st.header("Product Performance")
+    st.write("Product Performance by Revenue and Quantity Sold")
+
+    product_performance = calculate_product_performance(filtered_sales, products)
+
+    performance_columns = st.columns(2)
+    with performance_columns[0]:
+        st.subheader("Product Revenue")
+        fig_revenue = product_revenue_bar(product_performance)
+        st.plotly_chart(fig_revenue, use_container_width=True)
+
+    with performance_columns[1]:
+        st.subheader("Product Quantity Sold")
+        fig_quantity = product_quantity_bar(product_performance)
+        st.plotly_chart(fig_quantity, use_container_width=True)
+
+    # Campaign ROI Analysis
+    campaign_roi_analysis()
+
+    # # Campaign Drill-Down Reports
+    # st.header("Campaign Drill-Down Reports")
+    # selected_campaign_drill = st.selectbox(
+    #     "Select a Campaign for Detailed Insights",
+    #     options=marketing['campaign_name'].unique()
+    # )
+    # if selected_campaign_drill:
+    #     campaign_details_drill = marketing[marketing['campaign_name'] == selected_campaign_drill]
+    #     st.write("#### Campaign Details")
+    #     st.write(campaign_details_drill)
+    #     try:
+    #         sales_marketing = pd.read_csv("data/cleaned/sales_marketing.csv")
+    #         related_order_ids_drill = sales_marketing[sales_marketing['campaign_name'] == selected_campaign_drill]['order_id']
+    #         related_sales_drill = filtered_sales[filtered_sales['order_id'].isin(related_order_ids_drill)]
+    #         st.write("#### Sales Related to Selected Campaign")
+    #         st.write(related_sales_drill)
+    #     except FileNotFoundError:
+    #         st.warning("Sales-Marketing mapping file not found. Drill-down for campaigns is disabled.")
+
+
+def render_kpis():
+    from scripts.charts import sales_growth_over_time_chart
+
     st.header("Key Performance Indicators (KPIs)")
     st.write("Live KPI Metrics Summary")
+    approximate_mode = render_approximate_toggle()
+
+    errors = {}
+    if approximate_mode and not st.session_state.get("exact_kpis") and get_sales_sketches() is not None:
+        kpis, errors = get_approximate_kpis()
+        st.caption("Approximate values; hover a metric for its 95% error bound.")
+        if st.button("Show exact results", key="exact_kpis_button"):
+            st.session_state["exact_kpis"] = True
+            st.rerun()
+    else:
+        kpis = get_kpis()
 
-    kpis = kpi_calculations.calculate_all_kpis(engine)
+    def kpi_help(name):
+        return f"±{errors[name]:,.2f} (95%)" if name in errors else None
 
     kpi_columns = st.columns(3)
     kpi_columns[0].metric("Customer Acquisition Cost (CAC)", f"${kpis['Customer Acquisition Cost (CAC)']:.2f}")
-    kpi_columns[1].metric("Customer Lifetime Value (CLV)", f"${kpis['Customer Lifetime Value (CLV)']:.2f}")
+    kpi_columns[1].metric("Customer Lifetime Value (CLV)", f"${kpis['Customer Lifetime Value (CLV)']:.2f}",
+                          help=kpi_help('Customer Lifetime Value (CLV)'))
     kpi_columns[2].metric("Conversion Rate (%)", f"{kpis['Conversion Rate (%)']:.2f}")
 
     kpi_columns_2 = st.columns(2)
-    kpi_columns_2[0].metric("Sales Growth Rate (%)", f"{kpis['Sales Growth Rate (%)']:.2f}")
-    kpi_columns_2[1].metric("Average Order Value (AOV)", f"${kpis['Average Order Value (AOV)']:.2f}")
+    kpi_columns_2[0].metric("Sales Growth Rate (%)", f"{kpis['Sales Growth Rate (%)']:.2f}",
+                            help=kpi_help('Sales Growth Rate (%)'))
+    kpi_columns_2[1].metric("Average Order Value (AOV)", f"${kpis['Average Order Value (AOV)']:.2f}",
+                            help=kpi_help('Average Order Value (AOV)'))
 
     # Sales Growth Over Time
-    sales_growth_data = pd.read_sql("""
-        SELECT 
-            EXTRACT(YEAR FROM order_date) AS year,
-            EXTRACT(MONTH FROM order_date) AS month,
-            SUM(total_price) AS monthly_sales
-        FROM sales
-        GROUP BY EXTRACT(YEAR FROM order_date), EXTRACT(MONTH FROM order_date)
-        ORDER BY EXTRACT(YEAR FROM order_date), EXTRACT(MONTH FROM order_date)
-    """, engine)
-    sales_growth_data['year_month'] = sales_growth_data.apply(lambda row: f"{int(row['year'])}-{int(row['month']):02d}", axis=1)
-    fig_growth = sales_growth_over_time_chart(sales_growth_data)
+    fig_growth = sales_growth_over_time_chart(get_sales_growth_data())
     st.plotly_chart(fig_growth, use_container_width=True)
 
-with tabs[3]:
+    kpi_slices()
+
+
+@st.fragment
+def kpi_slices():
+    # Every slice and breakdown is a lookup in the cached KPI cube; no queries run here
+    from scripts.kpi_cube import CUBE_DIMENSIONS, cube_members
+    from scripts.kpi_calculations import calculate_slice_kpis
+
+    st.header("KPIs by Slice")
+    cube = get_kpi_cube()
+    if cube is None:
+        st.info("The KPI cube has not been built yet. Run scripts/kpi_cube.py.")
+        return
+
+    selection = {}
+    slice_columns = st.columns(len(CUBE_DIMENSIONS))
+    for column, dimension in zip(slice_columns, CUBE_DIMENSIONS):
+        selection[dimension] = column.selectbox(dimension.title(), ['All'] + cube_members(cube, dimension),
+                                                key=f"kpi_slice_{dimension}")
+
+    slice_kpis = calculate_slice_kpis(cube, **selection)
+    def money(value):
+        # Marketing ratios are not defined below the campaign level
+        return "N/A" if value is None else f"${value:.2f}"
+
+    slice_kpi_columns = st.columns(5)
+    slice_kpi_columns[0].metric("CAC", money(slice_kpis['Customer Acquisition Cost (CAC)']))
+    slice_kpi_columns[1].metric("CLV", money(slice_kpis['Customer Lifetime Value (CLV)']))
+    conversion_rate = slice_kpis['Conversion Rate (%)']
+    slice_kpi_columns[2].metric("Conversion Rate (%)", "N/A" if conversion_rate is None else f"{conversion_rate:.2f}")
+    slice_kpi_columns[3].metric("Sales Growth Rate (%)", f"{slice_kpis['Sales Growth Rate (%)']:.2f}")
+    slice_kpi_columns[4].metric("AOV", money(slice_kpis['Average Order Value (AOV)']))
+
+    open_dimensions = [dimension for dimension in CUBE_DIMENSIONS if selection[dimension] == 'All']
+    if not open_dimensions:
+        return
+    breakdown = st.selectbox("Break down by", open_dimensions, format_func=str.title, key="kpi_breakdown")
+    rows = [
+        {breakdown.title(): member, **calculate_slice_kpis(cube, **{**selection, breakdown: member})}
+        for member in cube_members(cube, breakdown)
+    ]
+    st.dataframe(pd.DataFrame(rows).round(2), use_container_width=True, hide_index=True)
+
+
+def render_cohorts():
+    from scripts.cohort_analysis import COHORT_METRICS
+    from scripts.charts import cohort_heatmap
+
+    st.header("Customer Cohorts")
+    st.write("Signup-month cohorts by months since signup.")
+    metric_label = st.selectbox("Metric", list(COHORT_METRICS))
+    matrix = get_cohort_matrix(COHORT_METRICS[metric_label])
+    if matrix is None:
+        st.info("Cohort data has not been computed yet. Run scripts/cohort_analysis.py.")
+        return
+    if matrix.empty:
+        st.warning("No cohort activity available.")
+        return
+    fig_cohorts = cohort_heatmap(matrix, metric_label)
+    st.plotly_chart(fig_cohorts, use_container_width=True)
+
+
+def render_predictive_analysis():
     st.header("Predictive Analysis (Hyperparameter Tuning)")
     st.write("We've added polynomial features and tuned them using GridSearchCV.")
-    prediction_df, cv_score, best_params = get_monthly_sales_prediction(engine)
+    prediction_df, cv_score, best_params = get_prediction()
     st.write("### Best Model Parameters:", best_params)
     st.write("Cross-Validation RMSE:", cv_score)
     st.dataframe(prediction_df)
+
+
+if page == "Home":
+    render_home()
+elif page == "Reports":
+    render_reports()
+elif page == "KPIs":
+    render_kpis()
+elif page == "Cohorts":
+    render_cohorts()
+elif page == "Predictive Analysis":
+    render_predictive_analysis()
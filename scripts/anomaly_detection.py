@@ -0,0 +1,236 @@
+"""
+This module flags anomalous days in the daily revenue and order series of every
+product, segment and campaign, and stores them in the anomalies table.
+
+All series are scored at once as rows of a series x day matrix:
+- the seasonal baseline of a day is the median of the same weekday over the
+  previous SEASONAL_CYCLES weeks;
+- the residuals (value - seasonal baseline) of the previous WINDOW_DAYS days give a
+  rolling median and MAD, and the day's robust z-score is its residual's distance
+  from that median in MAD units.
+Days with |z| >= Z_THRESHOLD are stored as 'spike' or 'drop'. A campaign series
+counts the orders placed while the campaign ran (once per order, even when
+several marketing rows of the campaign cover the day).
+
+The last scored day is kept in anomaly_state, so a run after a data load only
+scores the new days (reading just enough history for their baselines). The state
+also records the data version (scripts.data_snapshot) it was scored against; when
+data_upload has replaced history since, every day is rescored. Use --full after
+data for already scored days has changed in any other way.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import inspect, text
+from sqlalchemy.types import Date, DateTime, Float, String
+from scripts.database import get_engine
+from scripts.data_snapshot import built_version, get_data_version
+
+METRICS = ['revenue', 'orders']
+SEASONAL_PERIOD = 7
+SEASONAL_CYCLES = 4
+WINDOW_DAYS = 28
+Z_THRESHOLD = 3.5
+# Series with fewer non-zero days in the window are too sparse to score
+MIN_ACTIVE_DAYS = 7
+# MAD and mean absolute deviation scaled to a normal standard deviation
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+# Lower bound on the scale, in units of the metric ($ or orders)
+MIN_SCALE = 1.0
+# Days of history needed before the first scored day
+HISTORY_DAYS = SEASONAL_PERIOD * SEASONAL_CYCLES + WINDOW_DAYS
+
+DAILY_SERIES_QUERY = """
+    SELECT 'product' AS dimension, p.product_name AS member, s.order_date AS day,
+           SUM(s.total_price)::float8 AS revenue, COUNT(*) AS orders
+    FROM sales s
+    JOIN products p ON p.product_id = s.product_id
+    WHERE s.order_date >= :since
+    GROUP BY 1, 2, 3
+    UNION ALL
+    SELECT 'segment', COALESCE(c.segment, 'Unknown'), s.order_date,
+           SUM(s.total_price)::float8, COUNT(*)
+    FROM sales s
+    JOIN customers c ON c.customer_id = s.customer_id
+    WHERE s.order_date >= :since
+    GROUP BY 1, 2, 3
+    UNION ALL
+    SELECT 'campaign', c.campaign_name, s.order_date,
+           SUM(s.total_price)::float8, COUNT(*)
+    FROM (SELECT DISTINCT campaign_name FROM marketing) c
+    JOIN sales s ON EXISTS (
+        -- Once per order, even when rows of the same campaign overlap
+        SELECT 1 FROM marketing m
+        WHERE m.campaign_name = c.campaign_name
+          AND s.order_date BETWEEN m.start_date AND m.end_date
+    )
+    WHERE s.order_date >= :since
+    GROUP BY 1, 2, 3
+"""
+
+ANOMALY_DTYPES = {
+    'day': Date(),
+    'dimension': String(),
+    'member': String(),
+    'metric': String(),
+    'value': Float(),
+    'baseline': Float(),
+    'z_score': Float(),
+    'direction': String()
+}
+
+
+def load_daily_series(engine, since):
+    daily = pd.read_sql(text(DAILY_SERIES_QUERY), engine, params={'since': since})
+    daily['day'] = pd.to_datetime(daily['day'])
+    return daily
+
+
+def series_matrix(daily, start, end):
+    """
+    Pivots daily rows into one row per (dimension, member, metric) and one column
+    per calendar day from start to end; days without orders are 0.
+
+    Returns:
+    - keys: DataFrame with dimension, member and metric of each row.
+    - days: DatetimeIndex of the columns.
+    - values: 2-D float array (series x days).
+    """
+    days = pd.date_range(start, end, freq='D')
+    pivots = [
+        daily.pivot_table(index=['dimension', 'member'], columns='day', values=metric, aggfunc='sum')
+        .reindex(columns=days).fillna(0.0).assign(metric=metric).set_index('metric', append=True)
+        for metric in METRICS
+    ]
+    matrix = pd.concat(pivots)
+    return matrix.index.to_frame(index=False), days, matrix.to_numpy(dtype=np.float64)
+
+
+def seasonal_baseline(values, day_positions):
+    # Median of the same weekday over the previous SEASONAL_CYCLES periods
+    lags = SEASONAL_PERIOD * np.arange(1, SEASONAL_CYCLES + 1)
+    return np.median(values[:, day_positions[:, None] - lags], axis=2)
+
+
+def robust_z_scores(values, first):
+    """
+    Scores the columns of values from position first onwards (columns without
+    enough history are skipped).
+
+    Returns:
+    - positions: Scored column positions.
+    - baseline: Expected value per series and scored day (seasonal baseline + median residual).
+    - z: Robust z-score per series and scored day.
+    - active: Whether the series had at least MIN_ACTIVE_DAYS non-zero days in the window.
+    """
+    first = max(first, HISTORY_DAYS)
+    positions = np.arange(first, values.shape[1])
+    if not len(positions):
+        empty = np.empty((values.shape[0], 0))
+        return positions, empty, empty, empty.astype(bool)
+
+    residual_positions = np.arange(first - WINDOW_DAYS, values.shape[1])
+    seasonal = seasonal_baseline(values, residual_positions)
+    residuals = values[:, residual_positions] - seasonal
+    # windows[:, i] holds the WINDOW_DAYS residuals before scored day positions[i]
+    windows = sliding_window_view(residuals, WINDOW_DAYS, axis=1)[:, :-1]
+    center = np.median(windows, axis=2)
+    deviations = np.abs(windows - center[:, :, None])
+    scale = MAD_SCALE * np.median(deviations, axis=2)
+    scale = np.where(scale > 0, scale, MEAN_AD_SCALE * deviations.mean(axis=2))
+    scale = np.maximum(scale, MIN_SCALE)
+
+    z = (residuals[:, WINDOW_DAYS:] - center) / scale
+    baseline = seasonal[:, WINDOW_DAYS:] + center
+    value_windows = sliding_window_view(values[:, first - WINDOW_DAYS:], WINDOW_DAYS, axis=1)[:, :-1]
+    active = np.count_nonzero(value_windows, axis=2) >= MIN_ACTIVE_DAYS
+    return positions, baseline, z, active
+
+
+def flag_anomalies(keys, days, values, first=0, threshold=Z_THRESHOLD):
+    """
+    Scores all series for the days from position first onwards and returns the flagged ones.
+
+    Returns:
+    - anomalies: DataFrame with the columns of the anomalies table.
+    """
+    positions, baseline, z, active = robust_z_scores(values, first)
+    series_index, day_index = np.nonzero(active & (np.abs(z) >= threshold))
+    anomalies = keys.iloc[series_index].reset_index(drop=True)
+    anomalies.insert(0, 'day', days[positions[day_index]])
+    anomalies['value'] = values[series_index, positions[day_index]]
+    anomalies['baseline'] = baseline[series_index, day_index]
+    anomalies['z_score'] = z[series_index, day_index]
+    anomalies['direction'] = np.where(anomalies['z_score'] > 0, 'spike', 'drop')
+    return anomalies.sort_values(['day', 'dimension', 'member', 'metric'], ignore_index=True)
+
+
+def update_anomalies(engine, full=False):
+    """
+    Scores the days loaded since the last run and stores the flagged ones. All days
+    are scored if full=True or the data version changed since the last run.
+    """
+    last_scored = None
+    version = get_data_version(engine)
+    if version != built_version(engine, 'anomaly_state'):
+        full = True
+    if not full and inspect(engine).has_table('anomaly_state'):
+        last_scored = pd.read_sql("SELECT MAX(last_scored_day) AS last_scored FROM anomaly_state",
+                                  engine).iloc[0]['last_scored']
+    last_day = pd.read_sql("SELECT MAX(order_date) AS last_day FROM sales", engine).iloc[0]['last_day']
+    if pd.isnull(last_day):
+        print("No sales data to score.")
+        return None
+    last_day = pd.Timestamp(last_day)
+    if pd.notnull(last_scored) and pd.Timestamp(last_scored) >= last_day:
+        print(f"No new days since {pd.Timestamp(last_scored):%Y-%m-%d}; anomalies are up to date.")
+        return None
+
+    if pd.notnull(last_scored):
+        first_day = pd.Timestamp(last_scored) + pd.Timedelta(days=1)
+        start = first_day - pd.Timedelta(days=HISTORY_DAYS)
+    else:
+        first_day = None
+        start = pd.Timestamp(pd.read_sql("SELECT MIN(order_date) AS first_day FROM sales",
+                                          engine).iloc[0]['first_day'])
+
+    daily = load_daily_series(engine, start.date())
+    keys, days, values = series_matrix(daily, start, last_day)
+    first = 0 if first_day is None else days.get_loc(first_day)
+
+    scoring_start = time.perf_counter()
+    anomalies = flag_anomalies(keys, days, values, first)
+    elapsed = time.perf_counter() - scoring_start
+    scored_days = len(days) - max(first, HISTORY_DAYS)
+    print(f"Scored {len(keys)} series x {max(scored_days, 0)} days in {elapsed:.3f}s; "
+          f"{len(anomalies)} anomalies flagged.")
+
+    with engine.begin() as conn:
+        if first_day is None or not inspect(conn).has_table('anomalies'):
+            if_exists = 'replace'
+        else:
+            conn.execute(text("DELETE FROM anomalies WHERE day >= :first_day"), {'first_day': first_day.date()})
+            if_exists = 'append'
+        anomalies.to_sql('anomalies', conn, if_exists=if_exists, index=False, dtype=ANOMALY_DTYPES)
+        pd.DataFrame({'last_scored_day': [last_day.date()], 'data_version': [version],
+                      'scored_at': [pd.Timestamp.now()]}).to_sql(
+            'anomaly_state', conn, if_exists='replace', index=False,
+            dtype={'last_scored_day': Date(), 'data_version': String(), 'scored_at': DateTime()}
+        )
+        if if_exists == 'replace':
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_anomalies_day ON anomalies (day)"))
+    return anomalies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag anomalous days in the daily sales and campaign series.")
+    parser.add_argument('--full', action='store_true', help="Rescore all days instead of only new ones.")
+    args = parser.parse_args()
+    update_anomalies(get_engine(), full=args.full)
+
+
+if __name__ == "__main__":
+    main()
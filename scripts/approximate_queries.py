@@ -0,0 +1,330 @@
+"""
+This module backs the dashboard's opt-in approximate mode.
+
+Two compact tables are maintained from the cleaned sales data:
+- sales_sketches: one row per day x product x segment holding the order count,
+  HyperLogLog sketches of order and customer ids, and a t-digest of order values.
+- sales_sample: a stratified sample of orders (strata = month x segment) with
+  the stratum sizes needed to scale estimates and report error bounds.
+
+Both are keyed by month, so new data only rebuilds the months it touches.
+approximate_state records the data version (scripts.data_snapshot) they were
+built from; after data_upload replaces history, the next refresh rebuilds all months.
+"""
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import inspect, text
+from sqlalchemy.types import Date, Integer, LargeBinary, Numeric, String
+from scripts.database import get_engine
+from scripts.data_snapshot import built_version, get_data_version
+from scripts.sketches import (
+    hll_build,
+    hll_merge,
+    hll_estimate,
+    hll_relative_error,
+    hll_to_bytes,
+    hll_from_bytes,
+    tdigest_build,
+    tdigest_merge,
+    tdigest_quantile,
+    tdigest_to_bytes,
+    tdigest_from_bytes
+)
+from scripts import kpi_calculations
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_CLEANED_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'cleaned')
+
+SAMPLE_FRACTION = 0.01
+MIN_STRATUM_SAMPLE = 50
+SAMPLE_SEED = 42
+# z-value for the reported 95% error bounds
+Z_95 = 1.96
+
+SKETCH_DTYPES = {
+    'day': Date(),
+    'product_id': String(),
+    'segment': String(),
+    'order_count': Integer(),
+    'orders_hll': LargeBinary(),
+    'customers_hll': LargeBinary(),
+    'order_value_digest': LargeBinary()
+}
+
+SAMPLE_DTYPES = {
+    'order_id': Integer(),
+    'customer_id': String(),
+    'product_id': String(),
+    'quantity': Integer(),
+    'total_price': Numeric(),
+    'order_date': Date(),
+    'segment': String(),
+    'stratum': String(),
+    'stratum_size': Integer(),
+    'stratum_sample_size': Integer()
+}
+
+
+def _with_segment(sales_df, customers_df):
+    segments = customers_df.drop_duplicates(subset='customer_id').set_index('customer_id')['segment']
+    sales_df = sales_df.copy()
+    sales_df['order_date'] = pd.to_datetime(sales_df['order_date'])
+    sales_df['segment'] = sales_df['customer_id'].map(segments).fillna('Unknown')
+    return sales_df
+
+
+def build_sales_sketches(sales_df, customers_df):
+    """
+    Builds the per day x product x segment sketch rows. Months are processed one
+    at a time to bound the size of the register arrays.
+    """
+    sales_df = _with_segment(sales_df, customers_df)
+    sales_df['day'] = sales_df['order_date'].dt.normalize()
+
+    frames = []
+    for _, month_df in sales_df.groupby(sales_df['day'].dt.to_period('M'), sort=True):
+        grouped = month_df.groupby(['day', 'product_id', 'segment'], sort=True)
+        codes = grouped.ngroup().to_numpy()
+        month_sketches = grouped.size().reset_index(name='order_count')
+        num_groups = len(month_sketches)
+
+        orders_hll = hll_build(month_df['order_id'].to_numpy(), codes, num_groups)
+        customers_hll = hll_build(month_df['customer_id'].to_numpy(), codes, num_groups)
+        digests = tdigest_build(month_df['total_price'].to_numpy(dtype=np.float64), codes, num_groups)
+
+        month_sketches['orders_hll'] = [hll_to_bytes(r) for r in orders_hll]
+        month_sketches['customers_hll'] = [hll_to_bytes(r) for r in customers_hll]
+        month_sketches['order_value_digest'] = [tdigest_to_bytes(d) for d in digests]
+        frames.append(month_sketches)
+
+    if not frames:
+        return pd.DataFrame(columns=list(SKETCH_DTYPES))
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_stratified_sample(sales_df, customers_df, fraction=SAMPLE_FRACTION,
+                            min_per_stratum=MIN_STRATUM_SAMPLE, seed=SAMPLE_SEED):
+    """
+    Draws a stratified random sample of orders. Each month x segment stratum keeps
+    max(min_per_stratum, fraction * size) rows (or all rows if it is smaller).
+    """
+    sales_df = _with_segment(sales_df, customers_df)
+    sales_df['stratum'] = sales_df['order_date'].dt.strftime('%Y-%m') + '|' + sales_df['segment']
+
+    stratum_size = sales_df.groupby('stratum')['order_id'].transform('size')
+    target = np.minimum(stratum_size, np.maximum(min_per_stratum, np.ceil(stratum_size * fraction)))
+    random_key = np.random.default_rng(seed).random(len(sales_df))
+    rank = pd.Series(random_key, index=sales_df.index).groupby(sales_df['stratum']).rank(method='first')
+
+    sample = sales_df[rank <= target].copy()
+    sample['stratum_size'] = stratum_size[rank <= target].astype(int)
+    sample['stratum_sample_size'] = target[rank <= target].astype(int)
+    return sample[list(SAMPLE_DTYPES)]
+
+
+def update_approximate_tables(engine, sales_df, customers_df, full=False):
+    """
+    Refreshes sales_sketches and sales_sample. Unless full=True or the data version
+    changed since the last refresh, only the months from the last sketched month
+    onwards are rebuilt.
+    """
+    since = None
+    version = get_data_version(engine)
+    if version != built_version(engine, 'approximate_state'):
+        full = True
+    if not full and inspect(engine).has_table('sales_sketches') and inspect(engine).has_table('sales_sample'):
+        last_day = pd.read_sql("SELECT MAX(day) AS last_day FROM sales_sketches", engine).iloc[0]['last_day']
+        if pd.notnull(last_day):
+            # The last month may have been partial, so it is rebuilt too
+            since = pd.Timestamp(last_day).to_period('M').start_time
+
+    if since is not None:
+        sales_df = sales_df[pd.to_datetime(sales_df['order_date']) >= since]
+    sketches = build_sales_sketches(sales_df, customers_df)
+    sample = build_stratified_sample(sales_df, customers_df)
+
+    # One transaction, so a failed write never leaves the rebuilt months missing
+    with engine.begin() as conn:
+        if since is None:
+            if_exists = 'replace'
+        else:
+            if_exists = 'append'
+            conn.execute(text("DELETE FROM sales_sketches WHERE day >= :since"), {'since': since.date()})
+            conn.execute(text("DELETE FROM sales_sample WHERE order_date >= :since"), {'since': since.date()})
+        sketches.to_sql('sales_sketches', conn, if_exists=if_exists, index=False, dtype=SKETCH_DTYPES)
+        sample.to_sql('sales_sample', conn, if_exists=if_exists, index=False, dtype=SAMPLE_DTYPES)
+        pd.DataFrame({'data_version': [version], 'refreshed_at': [pd.Timestamp.now()]}).to_sql(
+            'approximate_state', conn, if_exists='replace', index=False)
+    scope = "all months" if since is None else f"months from {since:%Y-%m}"
+    print(f"Updated sales_sketches ({len(sketches)} rows) and sales_sample ({len(sample)} rows) for {scope}.")
+
+
+def filter_sketches(sketches, start_date=None, end_date=None, product_ids=None, segments=None, campaign_windows=None):
+    """
+    Selects the sketch rows matching the dashboard filters.
+
+    Parameters:
+    - campaign_windows: Optional list of (start_date, end_date) tuples; only days inside one of them are kept.
+    """
+    mask = pd.Series(True, index=sketches.index)
+    if start_date and end_date:
+        mask &= (sketches['day'] >= pd.to_datetime(start_date)) & (sketches['day'] <= pd.to_datetime(end_date))
+    if product_ids is not None:
+        mask &= sketches['product_id'].isin(product_ids)
+    if segments is not None:
+        mask &= sketches['segment'].isin(segments)
+    if campaign_windows is not None:
+        in_window = pd.Series(False, index=sketches.index)
+        for window_start, window_end in campaign_windows:
+            in_window |= (sketches['day'] >= window_start) & (sketches['day'] <= window_end)
+        mask &= in_window
+    return sketches[mask]
+
+
+def estimate_distinct(sketch_rows, column):
+    """
+    Returns the distinct count estimate of the merged HLL column and its 95% error bound.
+    """
+    if sketch_rows.empty:
+        return 0.0, 0.0
+    registers = hll_merge(np.stack([hll_from_bytes(b) for b in sketch_rows[column]]))
+    estimate = hll_estimate(registers)
+    return estimate, float(Z_95 * hll_relative_error() * estimate)
+
+
+def estimate_order_value_quantiles(sketch_rows, quantiles=(0.5, 0.9)):
+    digest = tdigest_merge([tdigest_from_bytes(b) for b in sketch_rows['order_value_digest']])
+    return {q: tdigest_quantile(digest, q) for q in quantiles}
+
+
+def estimate_sales_metrics(sample, mask=None):
+    """
+    Estimates total sales, order count and AOV for the orders selected by mask,
+    using stratified domain estimators with 95% error bounds.
+
+    Parameters:
+    - sample: sales_sample rows (all strata, not only the filtered ones).
+    - mask: Boolean Series over sample marking the orders matching the filters (default: all).
+
+    Returns:
+    - estimates: Dict with total_sales, order_count and aov, each with an '_error' counterpart.
+    """
+    if mask is None:
+        mask = pd.Series(True, index=sample.index)
+    in_domain = mask.to_numpy(dtype=np.float64)
+    price = sample['total_price'].to_numpy(dtype=np.float64)
+    y = price * in_domain
+
+    strata = sample.groupby('stratum', sort=False, observed=True)
+    stratum_codes = strata.ngroup().to_numpy()
+    sizes = strata['stratum_size'].first().to_numpy(dtype=np.float64)
+    sample_sizes = strata['stratum_sample_size'].first().to_numpy(dtype=np.float64)
+    expansion = sizes / sample_sizes
+    finite_population = np.where(sizes > 0, 1 - sample_sizes / sizes, 0.0)
+
+    def stratified_total(values):
+        totals = np.bincount(stratum_codes, weights=values, minlength=len(sizes))
+        squares = np.bincount(stratum_codes, weights=values * values, minlength=len(sizes))
+        variance_h = np.where(sample_sizes > 1,
+                              (squares - totals * totals / sample_sizes) / np.maximum(sample_sizes - 1, 1), 0.0)
+        total = float(np.sum(expansion * totals))
+        variance = float(np.sum(sizes * sizes * finite_population * np.maximum(variance_h, 0) / sample_sizes))
+        return total, variance
+
+    total_sales, total_variance = stratified_total(y)
+    order_count, count_variance = stratified_total(in_domain)
+    aov, aov_variance = 0.0, 0.0
+    if order_count > 0:
+        aov = total_sales / order_count
+        # Ratio estimator, linearised
+        _, residual_variance = stratified_total(in_domain * (price - aov))
+        aov_variance = residual_variance / (order_count * order_count)
+
+    return {
+        'total_sales': total_sales,
+        'total_sales_error': float(Z_95 * np.sqrt(total_variance)),
+        'order_count': order_count,
+        'order_count_error': float(Z_95 * np.sqrt(count_variance)),
+        'aov': aov,
+        'aov_error': float(Z_95 * np.sqrt(aov_variance)),
+    }
+
+
+def weighted_sample(sample):
+    """
+    Scales the additive columns of sample rows by their stratum expansion factor,
+    so sums over the result estimate sums over the full population.
+    """
+    weighted = sample.copy()
+    expansion = weighted['stratum_size'] / weighted['stratum_sample_size']
+    weighted['total_price'] = weighted['total_price'].astype(float) * expansion
+    weighted['quantity'] = weighted['quantity'].astype(float) * expansion
+    return weighted
+
+
+def calculate_approximate_kpis(engine, sketches, sample, current_year=2024):
+    """
+    Approximate counterpart of kpi_calculations.calculate_all_kpis. The KPIs over
+    the small customers/marketing tables stay exact; those over sales come from
+    the sketches and the sample.
+
+    Returns:
+    - kpis: Same keys as calculate_all_kpis.
+    - errors: 95% error bounds for the approximated KPIs.
+    """
+    overall = estimate_sales_metrics(sample)
+    distinct_customers, customers_error = estimate_distinct(sketches, 'customers_hll')
+    total_orders = float(sketches['order_count'].sum())
+
+    order_dates = pd.to_datetime(sample['order_date'])
+    current = estimate_sales_metrics(sample, order_dates.dt.year == current_year)
+    previous = estimate_sales_metrics(sample, order_dates.dt.year == current_year - 1)
+
+    orders_per_customer = total_orders / distinct_customers if distinct_customers else 0
+    clv = overall['aov'] * orders_per_customer
+    growth_rate = 0
+    growth_error = 0.0
+    if previous['total_sales']:
+        ratio = current['total_sales'] / previous['total_sales']
+        growth_rate = (ratio - 1) * 100
+        relative = np.hypot(current['total_sales_error'] / current['total_sales'] if current['total_sales'] else 0,
+                            previous['total_sales_error'] / previous['total_sales'])
+        growth_error = abs(ratio) * relative * 100
+
+    kpis = {
+        "Customer Acquisition Cost (CAC)": kpi_calculations.calculate_cac(engine),
+        "Customer Lifetime Value (CLV)": clv,
+        "Conversion Rate (%)": kpi_calculations.calculate_conversion_rate(engine),
+        "Sales Growth Rate (%)": growth_rate,
+        "Average Order Value (AOV)": overall['aov']
+    }
+    clv_relative = np.hypot(overall['aov_error'] / overall['aov'] if overall['aov'] else 0,
+                            customers_error / distinct_customers if distinct_customers else 0)
+    errors = {
+        "Customer Lifetime Value (CLV)": abs(clv) * clv_relative,
+        "Sales Growth Rate (%)": growth_error,
+        "Average Order Value (AOV)": overall['aov_error']
+    }
+    return kpis, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the sketches and sample used by approximate mode.")
+    parser.add_argument('--full', action='store_true', help="Rebuild all months instead of only new ones.")
+    args = parser.parse_args()
+
+    sales_cleaned_path = os.path.join(DATA_CLEANED_DIR, 'sales_cleaned.csv')
+    customers_cleaned_path = os.path.join(DATA_CLEANED_DIR, 'customers_cleaned.csv')
+    if not os.path.exists(sales_cleaned_path) or not os.path.exists(customers_cleaned_path):
+        print("Error: cleaned sales/customers CSVs not found. Please run data_cleaning.py first.")
+        exit(1)
+
+    sales = pd.read_csv(sales_cleaned_path, parse_dates=['order_date'])
+    customers = pd.read_csv(customers_cleaned_path, usecols=['customer_id', 'segment'])
+    update_approximate_tables(get_engine(), sales, customers, full=args.full)
+
+
+if __name__ == "__main__":
+    main()
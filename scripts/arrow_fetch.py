@@ -0,0 +1,145 @@
+"""
+This module is the columnar fetch path used by the large-table loaders in data_loading.
+
+pd.read_sql builds rows of Python objects through a DB-API cursor. Numeric()
+columns then arrive as Decimal objects, dates as datetime.date objects, and
+every string is a separate Python object. Here the result is fetched as one
+columnar Arrow table instead:
+- with ADBC (adbc-driver-postgresql) when it is installed, otherwise
+- with COPY (query) TO STDOUT through psycopg2, parsed by Arrow's multithreaded
+  CSV reader with the column types taken from the query's result OIDs.
+
+The table is then normalised: money becomes float64, dates become datetime64[ns],
+and strings are dictionary-encoded (pandas category). Engines other than
+PostgreSQL fall back to pd.read_sql followed by the same normalisation.
+
+The statements run on the DBAPI cursor of a SQLAlchemy connection, which bypasses
+SQLAlchemy's execution events, so before_cursor_execute is fired for each of them
+explicitly; listeners such as the query counter in scripts.load_test see them
+like any other query.
+"""
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from scripts.database import get_engine
+
+try:
+    import adbc_driver_postgresql.dbapi as adbc_postgresql
+except ImportError:
+    adbc_postgresql = None
+
+# PostgreSQL type OIDs -> Arrow types used to parse COPY output
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int64(),
+    23: pa.int64(),
+    700: pa.float64(),
+    701: pa.float64(),
+    1700: pa.float64(),  # numeric (money columns)
+    1082: pa.date32(),
+    1114: pa.timestamp('us'),
+    1184: pa.timestamp('us', tz='UTC'),
+}
+
+
+def _cursor_event(conn, cursor, statement):
+    conn.dispatch.before_cursor_execute(conn, cursor, statement, {}, None, False)
+
+
+def _result_columns(conn, cursor, query):
+    statement = f"SELECT * FROM ({query}) AS q LIMIT 0"
+    _cursor_event(conn, cursor, statement)
+    cursor.execute(statement)
+    return [(column[0], PG_ARROW_TYPES.get(column[1], pa.string())) for column in cursor.description]
+
+
+def _fetch_copy(conn, cursor, query, columns):
+    # ISO dates with +00 offsets whatever the server defaults; LOCAL ends with the transaction
+    cursor.execute("SET LOCAL TimeZone TO 'UTC'")
+    cursor.execute("SET LOCAL DateStyle TO 'ISO'")
+    buffer = io.BytesIO()
+    statement = f"COPY ({query}) TO STDOUT WITH (FORMAT csv)"
+    _cursor_event(conn, cursor, statement)
+    cursor.copy_expert(statement, buffer)
+    names = [name for name, _ in columns]
+    if not buffer.getbuffer().nbytes:
+        return pa.table({name: pa.array([], type=arrow_type) for name, arrow_type in columns})
+    return pa_csv.read_csv(
+        # Read the BytesIO buffer in place rather than copying it out with getvalue()
+        pa.py_buffer(buffer.getbuffer()),
+        read_options=pa_csv.ReadOptions(column_names=names),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=dict(columns),
+            # COPY writes NULL as an unquoted empty field and '' as a quoted one
+            null_values=[''],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            # and booleans as t/f
+            true_values=['t'],
+            false_values=['f']
+        )
+    )
+
+def _fetch_adbc(engine, query, columns):
+    uri = engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+    with adbc_postgresql.connect(uri) as conn, conn.cursor() as cursor:
+        cursor.execute(query)
+        table = cursor.fetch_arrow_table()
+    # ADBC returns NUMERIC as strings; cast to the types the OIDs call for
+    for i, (name, arrow_type) in enumerate(columns):
+        if table.schema.field(i).type != arrow_type and arrow_type != pa.string():
+            table = table.set_column(i, name, table.column(i).cast(arrow_type))
+    return table
+
+
+def fetch_arrow_table(query, engine=None):
+    """
+    Runs a query (no bind parameters) and returns its result as an Arrow table.
+    """
+    engine = engine or get_engine()
+    if engine.dialect.name != 'postgresql':
+        return pa.Table.from_pandas(pd.read_sql(query, engine), preserve_index=False)
+
+    with engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            columns = _result_columns(conn, cursor, query)
+            if adbc_postgresql is not None:
+                _cursor_event(conn, cursor, query)
+                return _fetch_adbc(engine, query, columns)
+            return _fetch_copy(conn, cursor, query, columns)
+        finally:
+            cursor.close()
+
+
+def normalize_table(table):
+    """
+    Money to float64, dates to timestamp[ns], strings dictionary-encoded.
+    """
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if pa.types.is_decimal(field.type):
+            column = column.cast(pa.float64())
+        elif pa.types.is_date(field.type):
+            column = column.cast(pa.timestamp('ns'))
+        elif pa.types.is_timestamp(field.type) and field.type.unit != 'ns':
+            column = column.cast(pa.timestamp('ns', tz=field.type.tz))
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            column = column.dictionary_encode()
+        else:
+            continue
+        table = table.set_column(i, field.name, column)
+    return table
+
+
+def read_sql_arrow(query, engine=None):
+    """
+    Drop-in for pd.read_sql(query, engine) on large tables.
+
+    Returns:
+    - df: DataFrame with float64 money, datetime64[ns] dates and category strings.
+    """
+    table = normalize_table(fetch_arrow_table(query, engine))
+    return table.to_pandas(split_blocks=True, self_destruct=True)
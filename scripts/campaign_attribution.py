@@ -0,0 +1,211 @@
+"""
+This module attributes sales to marketing campaigns without building the
+order x campaign mapping. Orders are reduced to daily totals, and the campaign
+start and end events are swept over the days (a difference array for the number
+of active campaigns, prefix sums for the totals inside each window), so working
+memory is days + campaigns instead of orders x overlapping campaigns.
+
+Attribution models:
+- all_touch: every campaign active on the order date gets full credit.
+- first_touch: only the active campaign that started earliest gets credit.
+- last_touch: only the active campaign that started most recently gets credit.
+- linear: credit is split evenly across all campaigns active on the order date.
+
+Results are written to the campaign_performance table.
+"""
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy.types import Date, Float, Integer, String
+from scripts.database import get_engine
+
+ATTRIBUTION_MODELS = ['all_touch', 'first_touch', 'last_touch', 'linear']
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_CLEANED_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'cleaned')
+
+
+def _to_days(dates):
+    return pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def _clipped_windows(starts, ends, num_days):
+    # Window [start, end] as half-open day offsets clipped to the order date range
+    lo = np.clip(starts, 0, num_days)
+    hi = np.clip(ends + 1, 0, num_days)
+    return lo, np.maximum(hi, lo)
+
+
+def _active_counts(lo, hi, num_days):
+    """
+    Number of active campaigns per day, from the sorted +1 start / -1 end events.
+    """
+    events = np.bincount(lo, minlength=num_days + 1) - np.bincount(hi, minlength=num_days + 1)
+    return np.cumsum(events)[:num_days]
+
+
+def _window_sums(daily_values, lo, hi):
+    prefix = np.r_[0.0, np.cumsum(daily_values)]
+    return prefix[hi] - prefix[lo]
+
+
+def _touch_winner(lo, hi, starts, num_days, last=False):
+    """
+    Picks the credited campaign for each day under first/last touch by sweeping
+    the campaigns in start order; a day goes to the first campaign covering it.
+    Ties on start date go to the campaign listed first. Days without an active campaign get -1.
+    """
+    rank = np.argsort(starts, kind='stable')
+    if last:
+        rank = rank[::-1]
+    winner = np.full(num_days, -1, dtype=np.int64)
+    for campaign in rank:
+        days = winner[lo[campaign]:hi[campaign]]
+        days[days < 0] = campaign
+    return winner
+
+
+def _all_touch_unique_customers(customer_codes, day_offsets, num_days, starts, ends):
+    """
+    Counts distinct customers with at least one order inside each campaign window.
+    A customer is counted once per window by only counting their first order day
+    inside it, i.e. an order day whose previous order day for that customer falls
+    before the window start. Pairs are swept in day order, so each campaign reads
+    only the slice of days inside its window.
+    """
+    # Distinct (customer, day) pairs, sorted by customer then day
+    pairs = np.unique(customer_codes * num_days + day_offsets)
+    customers, days = np.divmod(pairs, num_days)
+    same_customer = np.r_[False, customers[1:] == customers[:-1]]
+    previous_day = np.where(same_customer, np.r_[0, days[:-1]], np.iinfo(np.int64).min)
+
+    by_day = np.argsort(days, kind='stable')
+    days = days[by_day]
+    previous_day = previous_day[by_day]
+
+    counts = np.zeros(len(starts), dtype=np.int64)
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        lo = np.searchsorted(days, start, side='left')
+        hi = np.searchsorted(days, end, side='right')
+        counts[i] = np.count_nonzero(previous_day[lo:hi] < start)
+    return counts
+
+
+def _winner_unique_customers(customer_codes, day_offsets, winner, num_campaigns):
+    credited = winner[day_offsets]
+    has_winner = credited >= 0
+    codes = np.unique(customer_codes[has_winner] * num_campaigns + credited[has_winner])
+    return np.bincount(codes % num_campaigns, minlength=num_campaigns)
+
+
+def attribute_campaigns(sales_df, marketing_df, models=ATTRIBUTION_MODELS):
+    """
+    Computes attributed revenue, order counts and unique customers per campaign.
+
+    Parameters:
+    - sales_df: Sales DataFrame with 'order_date', 'customer_id' and 'total_price'.
+    - marketing_df: Marketing DataFrame with 'campaign_id', 'campaign_name', 'start_date' and 'end_date'.
+    - models: Attribution models to compute (see ATTRIBUTION_MODELS).
+
+    Returns:
+    - performance_df: One row per campaign and attribution model.
+    """
+    marketing_df = marketing_df.reset_index(drop=True)
+    extra_columns = [c for c in ['spend', 'conversions', 'impressions', 'start_date', 'end_date']
+                     if c in marketing_df.columns]
+    num_campaigns = len(marketing_df)
+    if num_campaigns == 0:
+        # e.g. validation quarantined every marketing row
+        columns = ['campaign_id', 'campaign_name', 'attribution_model', 'attributed_revenue',
+                   'attributed_orders', 'unique_customers'] + extra_columns
+        return pd.DataFrame(columns=columns + (['ROAS'] if 'spend' in extra_columns else []))
+
+    starts = _to_days(marketing_df['start_date'])
+    ends = _to_days(marketing_df['end_date'])
+
+    order_days = _to_days(sales_df['order_date'])
+    revenue = sales_df['total_price'].to_numpy(dtype=np.float64)
+    customer_codes, _ = pd.factorize(sales_df['customer_id'])
+    customer_codes = customer_codes.astype(np.int64)
+
+    first_day = order_days.min() if len(order_days) else 0
+    num_days = int(order_days.max() - first_day) + 1 if len(order_days) else 0
+    day_offsets = order_days - first_day
+    daily_revenue = np.bincount(day_offsets, weights=revenue, minlength=num_days)
+    daily_orders = np.bincount(day_offsets, minlength=num_days).astype(np.float64)
+    lo, hi = _clipped_windows(starts - first_day, ends - first_day, num_days)
+    active_count = _active_counts(lo, hi, num_days)
+    window_customers = None
+
+    results = []
+    for model in models:
+        if model in ('all_touch', 'linear') and window_customers is None:
+            # Both models credit every active campaign, so the customer sweep runs once
+            window_customers = _all_touch_unique_customers(
+                customer_codes, day_offsets, num_days, starts - first_day, ends - first_day)
+
+        if model == 'all_touch':
+            campaign_revenue = _window_sums(daily_revenue, lo, hi)
+            campaign_orders = _window_sums(daily_orders, lo, hi)
+            unique_customers = window_customers
+        elif model == 'linear':
+            share = np.divide(1.0, active_count, out=np.zeros(num_days), where=active_count > 0)
+            campaign_revenue = _window_sums(daily_revenue * share, lo, hi)
+            campaign_orders = _window_sums(daily_orders * share, lo, hi)
+            unique_customers = window_customers
+        elif model in ('first_touch', 'last_touch'):
+            winner = _touch_winner(lo, hi, starts, num_days, last=(model == 'last_touch'))
+            credited = winner >= 0
+            campaign_revenue = np.bincount(winner[credited], weights=daily_revenue[credited], minlength=num_campaigns)
+            campaign_orders = np.bincount(winner[credited], weights=daily_orders[credited], minlength=num_campaigns)
+            unique_customers = _winner_unique_customers(customer_codes, day_offsets, winner, num_campaigns)
+        else:
+            raise ValueError(f"Unknown attribution model: {model}")
+
+        model_df = marketing_df[['campaign_id', 'campaign_name']].copy()
+        model_df['attribution_model'] = model
+        model_df['attributed_revenue'] = np.round(campaign_revenue, 2)
+        model_df['attributed_orders'] = campaign_orders
+        model_df['unique_customers'] = unique_customers
+        results.append(model_df)
+
+    performance_df = pd.concat(results, ignore_index=True)
+    performance_df = performance_df.merge(marketing_df[['campaign_id'] + extra_columns], on='campaign_id', how='left')
+    if 'spend' in performance_df.columns:
+        performance_df['ROAS'] = np.where(performance_df['spend'] > 0,
+                                          performance_df['attributed_revenue'] / performance_df['spend'], 0.0)
+    return performance_df
+
+
+def upload_campaign_performance(performance_df, engine):
+    dtype = {
+        'campaign_id': String(),
+        'campaign_name': String(),
+        'attribution_model': String(),
+        'attributed_revenue': Float(),
+        'attributed_orders': Float(),
+        'unique_customers': Integer(),
+        'start_date': Date(),
+        'end_date': Date()
+    }
+    performance_df.to_sql('campaign_performance', engine, if_exists='replace', index=False, dtype=dtype)
+    print(f"Successfully uploaded campaign_performance ({len(performance_df)} rows) to PostgreSQL.")
+
+
+def main():
+    sales_cleaned_path = os.path.join(DATA_CLEANED_DIR, 'sales_cleaned.csv')
+    marketing_cleaned_path = os.path.join(DATA_CLEANED_DIR, 'marketing_cleaned.csv')
+    if not os.path.exists(sales_cleaned_path) or not os.path.exists(marketing_cleaned_path):
+        print("Error: cleaned sales/marketing CSVs not found. Please run data_cleaning.py first.")
+        exit(1)
+
+    sales = pd.read_csv(sales_cleaned_path, usecols=['order_date', 'customer_id', 'total_price'],
+                        parse_dates=['order_date'])
+    marketing = pd.read_csv(marketing_cleaned_path, parse_dates=['start_date', 'end_date'])
+
+    performance = attribute_campaigns(sales, marketing)
+    upload_campaign_performance(performance, get_engine())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import plotly.express as px
 
 def monthly_sales_trend_chart(filtered_sales, start_date, end_date):
-    filtered_sales['month'] = filtered_sales['order_date'].dt.to_period("M").astype(str)
-    monthly_sales_filtered = filtered_sales.groupby('month')['total_price'].sum().reset_index()
+    # filtered_sales may be the shared sales table, so it is not modified
+    month = filtered_sales['order_date'].dt.to_period("M").astype(str).rename('month')
+    monthly_sales_filtered = filtered_sales.groupby(month)['total_price'].sum().reset_index()
     fig = px.line(
         monthly_sales_filtered,
         x='month',
@@ -13,13 +14,16 @@ def monthly_sales_trend_chart(filtered_sales, start_date, end_date):
     return fig
 
 def campaign_spend_vs_conversions(marketing_data):
+    # Attributed columns are present when campaign_performance has been joined in
+    attributed = [c for c in ['attributed_revenue', 'attributed_orders', 'unique_customers', 'ROAS']
+                  if c in marketing_data.columns]
     fig = px.scatter(
         marketing_data,
         x='spend',
         y='conversions',
         color='campaign_name',
         size='impressions',
-        hover_data=['campaign_id', 'ROI'],
+        hover_data=['campaign_id', 'ROI'] + attributed,
         title="Campaign Spend vs. Conversions"
     )
     fig.update_traces(marker=dict(opacity=0.7, line=dict(width=1, color='DarkSlateGrey')))
@@ -46,3 +50,15 @@ def sales_growth_over_time_chart(sales_growth_data):
         labels={"year_month": "Year-Month", "monthly_sales": "Monthly Sales ($)"}
     )
     return fig
+
+def cohort_heatmap(cohort_matrix, metric_label):
+    fig = px.imshow(
+        cohort_matrix,
+        labels={"x": "Months Since Signup", "y": "Signup Cohort", "color": metric_label},
+        color_continuous_scale="Blues",
+        aspect="auto",
+        text_auto=".0f",
+        title=f"Cohort Analysis: {metric_label}"
+    )
+    fig.update_xaxes(side="top", dtick=1)
+    return fig
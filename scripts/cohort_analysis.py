@@ -0,0 +1,119 @@
+"""
+This module builds signup-month cohorts in a single grouped SQL pass over sales.
+Activity is stored per (cohort month, activity month) in the cohort_activity
+table. New data only adds activity months, so a refresh aggregates the months
+from the last stored one onwards. data_upload replaces history, though, so
+cohort_state records the data version (scripts.data_snapshot) the table was
+built from, and a new version triggers a full rebuild. The matrices shown in the dashboard
+are pivots of this small table, so their cost does not grow with customers.
+"""
+import argparse
+import pandas as pd
+from sqlalchemy import inspect, text
+from sqlalchemy.types import Date, Float, Integer
+from scripts.database import get_engine
+from scripts.data_snapshot import built_version, get_data_version
+
+COHORT_METRICS = {
+    "Retention (%)": 'retention',
+    "Active Customers": 'active_customers',
+    "Revenue ($)": 'revenue',
+}
+
+COHORT_ACTIVITY_QUERY = """
+    SELECT
+        DATE_TRUNC('month', c.signup_date)::date AS cohort_month,
+        DATE_TRUNC('month', s.order_date)::date AS activity_month,
+        COUNT(DISTINCT s.customer_id) AS active_customers,
+        SUM(s.total_price) AS revenue
+    FROM sales s
+    JOIN customers c ON c.customer_id = s.customer_id
+    WHERE s.order_date >= :since
+      AND DATE_TRUNC('month', s.order_date) >= DATE_TRUNC('month', c.signup_date)
+    GROUP BY 1, 2
+"""
+
+COHORT_SIZE_QUERY = """
+    SELECT DATE_TRUNC('month', signup_date)::date AS cohort_month, COUNT(*) AS cohort_size
+    FROM customers
+    GROUP BY 1
+"""
+
+COHORT_DTYPES = {
+    'cohort_month': Date(),
+    'activity_month': Date(),
+    'active_customers': Integer(),
+    'revenue': Float()
+}
+
+
+def update_cohort_activity(engine, full=False):
+    """
+    Refreshes the cohort_activity table. Unless full=True or the data version changed
+    since the last refresh, only activity months from the last stored month onwards
+    are recomputed (that month may have been partial).
+    """
+    since = None
+    version = get_data_version(engine)
+    if version != built_version(engine, 'cohort_state'):
+        full = True
+    if not full and inspect(engine).has_table('cohort_activity'):
+        last_month = pd.read_sql("SELECT MAX(activity_month) AS last_month FROM cohort_activity",
+                                 engine).iloc[0]['last_month']
+        if pd.notnull(last_month):
+            since = pd.Timestamp(last_month).date()
+
+    with engine.begin() as conn:
+        activity = pd.read_sql(text(COHORT_ACTIVITY_QUERY), conn, params={'since': since or '1900-01-01'})
+        if since is None:
+            if_exists = 'replace'
+        else:
+            conn.execute(text("DELETE FROM cohort_activity WHERE activity_month >= :since"), {'since': since})
+            if_exists = 'append'
+        activity.to_sql('cohort_activity', conn, if_exists=if_exists, index=False, dtype=COHORT_DTYPES)
+        pd.DataFrame({'data_version': [version], 'refreshed_at': [pd.Timestamp.now()]}).to_sql(
+            'cohort_state', conn, if_exists='replace', index=False)
+
+    scope = "all months" if since is None else f"months from {since:%Y-%m}"
+    print(f"Updated cohort_activity with {len(activity)} rows for {scope}.")
+    return activity
+
+
+def cohort_matrix(activity_df, cohort_sizes_df, metric='retention'):
+    """
+    Pivots cohort activity into a signup-month x months-since-signup matrix.
+
+    Parameters:
+    - activity_df: Rows of cohort_activity.
+    - cohort_sizes_df: DataFrame with 'cohort_month' and 'cohort_size'.
+    - metric: 'retention' (% of the cohort active), 'active_customers' or 'revenue'.
+
+    Returns:
+    - matrix: DataFrame indexed by cohort month ('YYYY-MM') with one column per months since signup.
+    """
+    activity = activity_df.copy()
+    cohort_month = pd.to_datetime(activity['cohort_month'])
+    activity_month = pd.to_datetime(activity['activity_month'])
+    activity['months_since_signup'] = ((activity_month.dt.year - cohort_month.dt.year) * 12 +
+                                       (activity_month.dt.month - cohort_month.dt.month))
+    activity['cohort'] = cohort_month.dt.strftime('%Y-%m')
+
+    if metric == 'retention':
+        sizes = cohort_sizes_df.assign(
+            cohort=pd.to_datetime(cohort_sizes_df['cohort_month']).dt.strftime('%Y-%m')
+        ).set_index('cohort')['cohort_size']
+        activity['retention'] = activity['active_customers'] / activity['cohort'].map(sizes) * 100
+
+    matrix = activity.pivot_table(index='cohort', columns='months_since_signup', values=metric, aggfunc='sum')
+    return matrix.sort_index().sort_index(axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the cohort_activity table.")
+    parser.add_argument('--full', action='store_true', help="Recompute all months instead of only new ones.")
+    args = parser.parse_args()
+    update_cohort_activity(get_engine(), full=args.full)
+
+
+if __name__ == "__main__":
+    main()
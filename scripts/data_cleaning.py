@@ -1,9 +1,12 @@
 # scripts/data_cleaning.py
 
+import argparse
 import pandas as pd
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 import os
+from scripts.data_validation import validate_all
+from scripts import profiling
 
 load_dotenv()
 
@@ -16,12 +19,14 @@ db_name = os.getenv('DB_NAME')
 engine = create_engine(f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}')
 
 
+@profiling.profiled()
 def clean_sales_data(df):
     df.dropna(subset=['order_id', 'customer_id', 'product_id', 'quantity', 'total_price'], inplace=True)
     df['order_date'] = pd.to_datetime(df['order_date'])
     return df
 
 
+@profiling.profiled()
 def clean_customer_data(df):
     df.dropna(subset=['customer_id', 'signup_date', 'email'], inplace=True)
     df['signup_date'] = pd.to_datetime(df['signup_date'])
@@ -29,11 +34,13 @@ def clean_customer_data(df):
     return df
 
 
+@profiling.profiled()
 def clean_product_data(df):
     df.dropna(subset=['product_id', 'product_name', 'price'], inplace=True)
     return df
 
 
+@profiling.profiled()
 def clean_marketing_data(df):
     df.dropna(subset=['campaign_id', 'campaign_name', 'spend', 'conversions', 'impressions'], inplace=True)
     df['start_date'] = pd.to_datetime(df['start_date'])
@@ -41,12 +48,14 @@ def clean_marketing_data(df):
     return df
 
 
+@profiling.profiled()
 def feature_engineering_sales(df):
     df['month'] = df['order_date'].dt.month
     df['year'] = df['order_date'].dt.year
     return df
 
 
+@profiling.profiled()
 def generate_sales_marketing_mapping(sales_df, marketing_df):
     """
     Generates a sales-marketing mapping DataFrame by associating each order with active marketing campaigns.
@@ -88,29 +97,48 @@ def generate_sales_marketing_mapping(sales_df, marketing_df):
     return sales_marketing_df
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Clean, validate and save the raw CSVs.")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+
+    with profiling.run('data_cleaning', args):
+        # Read raw CSVs
+        with profiling.stage('read_raw') as record:
+            sales = pd.read_csv('data/raw/sales.csv')
+            customers = pd.read_csv('data/raw/customers.csv')
+            products = pd.read_csv('data/raw/products.csv')
+            marketing = pd.read_csv('data/raw/marketing.csv')
+            record.rows_out = profiling.row_count((sales, customers, products, marketing))
+
+        # Clean data
+        sales = clean_sales_data(sales)
+        sales = feature_engineering_sales(sales)
+        customers = clean_customer_data(customers)
+        products = clean_product_data(products)
+        marketing = clean_marketing_data(marketing)
+
+        # Validate and quarantine offending rows
+        tables = (sales, customers, products, marketing)
+        with profiling.stage('validate_all', rows_in=profiling.row_count(tables)) as record:
+            sales, customers, products, marketing = tables = validate_all(*tables)
+            record.rows_out = profiling.row_count(tables)
+
+        # Save cleaned data
+        with profiling.stage('write_cleaned', rows_in=profiling.row_count(tables)):
+            sales.to_csv('data/cleaned/sales_cleaned.csv', index=False)
+            customers.to_csv('data/cleaned/customers_cleaned.csv', index=False)
+            products.to_csv('data/cleaned/products_cleaned.csv', index=False)
+            marketing.to_csv('data/cleaned/marketing_cleaned.csv', index=False)
+
+        print("Data cleaning completed.")
+
+        # Generate sales-marketing mapping
+        sales_marketing = generate_sales_marketing_mapping(sales, marketing)
+        with profiling.stage('write_mapping', rows_in=len(sales_marketing)):
+            sales_marketing.to_csv('data/cleaned/sales_marketing.csv', index=False)
+        print("Sales-Marketing mapping completed and saved to sales_marketing.csv.")
+
+
 if __name__ == "__main__":
-    # Read raw CSVs
-    sales = pd.read_csv('data/raw/sales.csv')
-    customers = pd.read_csv('data/raw/customers.csv')
-    products = pd.read_csv('data/raw/products.csv')
-    marketing = pd.read_csv('data/raw/marketing.csv')
-
-    # Clean data
-    sales = clean_sales_data(sales)
-    sales = feature_engineering_sales(sales)
-    customers = clean_customer_data(customers)
-    products = clean_product_data(products)
-    marketing = clean_marketing_data(marketing)
-
-    # Save cleaned data
-    sales.to_csv('data/cleaned/sales_cleaned.csv', index=False)
-    customers.to_csv('data/cleaned/customers_cleaned.csv', index=False)
-    products.to_csv('data/cleaned/products_cleaned.csv', index=False)
-    marketing.to_csv('data/cleaned/marketing_cleaned.csv', index=False)
-
-    print("Data cleaning completed.")
-
-    # Generate sales-marketing mapping
-    sales_marketing = generate_sales_marketing_mapping(sales, marketing)
-    sales_marketing.to_csv('data/cleaned/sales_marketing.csv', index=False)
-    print("Sales-Marketing mapping completed and saved to sales_marketing.csv.")
+    main()
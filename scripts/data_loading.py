@@ -1,12 +1,14 @@
 """
 This module provides functions to load data from the database.
 For performance, consider indexing frequently filtered columns in the DB.
+The engine is looked up on each call, so importing this module does not touch the DB.
+The large base tables are fetched column-wise through scripts.arrow_fetch: money
+arrives as float64, dates as datetime64 and strings as categories.
 """
 import pandas as pd
+from scripts.arrow_fetch import read_sql_arrow
 from scripts.database import get_engine
 
-engine = get_engine()
-
 def load_sales_data(start_date=None, end_date=None, product_ids=None, customer_ids=None):
     query = "SELECT * FROM sales WHERE 1=1"
     if start_date and end_date:
@@ -17,12 +19,12 @@ def load_sales_data(start_date=None, end_date=None, product_ids=None, customer_i
     if customer_ids:
         cust_list = ",".join(f"'{c}'" for c in customer_ids)
         query += f" AND customer_id IN ({cust_list})"
-    df = pd.read_sql(query, engine)
+    df = read_sql_arrow(query)
     df['order_date'] = pd.to_datetime(df['order_date'])
     return df
 
 def load_customer_data():
-    df = pd.read_sql("SELECT * FROM customers", engine)
+    df = read_sql_arrow("SELECT * FROM customers")
     if 'signup_date' in df.columns:
         df['signup_date'] = pd.to_datetime(df['signup_date'])
     if 'last_order_date' in df.columns:
@@ -30,11 +32,11 @@ def load_customer_data():
     return df
 
 def load_product_data():
-    df = pd.read_sql("SELECT * FROM products", engine)
+    df = read_sql_arrow("SELECT * FROM products")
     return df
 
 def load_marketing_data():
-    df = pd.read_sql("SELECT * FROM marketing", engine)
+    df = read_sql_arrow("SELECT * FROM marketing")
     if 'start_date' in df.columns:
         df['start_date'] = pd.to_datetime(df['start_date'])
     if 'end_date' in df.columns:
@@ -43,6 +45,46 @@ def load_marketing_data():
         df['ROI'] = (df['conversions'] / df['spend']) * 100.0
     return df
 
+def load_campaign_performance(attribution_model='all_touch'):
+    query = "SELECT * FROM campaign_performance WHERE attribution_model = %(model)s"
+    df = pd.read_sql(query, get_engine(), params={'model': attribution_model})
+    if 'start_date' in df.columns:
+        df['start_date'] = pd.to_datetime(df['start_date'])
+    if 'end_date' in df.columns:
+        df['end_date'] = pd.to_datetime(df['end_date'])
+    return df
+
+def load_sales_sketches():
+    df = pd.read_sql("SELECT * FROM sales_sketches", get_engine())
+    df['day'] = pd.to_datetime(df['day'])
+    return df
+
+def load_sales_sample():
+    df = read_sql_arrow("SELECT * FROM sales_sample")
+    df['order_date'] = pd.to_datetime(df['order_date'])
+    return df
+
+def load_cohort_activity():
+    df = pd.read_sql("SELECT * FROM cohort_activity", get_engine())
+    df['cohort_month'] = pd.to_datetime(df['cohort_month'])
+    df['activity_month'] = pd.to_datetime(df['activity_month'])
+    return df
+
+def load_cohort_sizes():
+    from scripts.cohort_analysis import COHORT_SIZE_QUERY
+    df = pd.read_sql(COHORT_SIZE_QUERY, get_engine())
+    df['cohort_month'] = pd.to_datetime(df['cohort_month'])
+    return df
+
+def load_kpi_cube():
+    df = pd.read_sql("SELECT * FROM kpi_cube", get_engine())
+    return df
+
+def load_anomalies():
+    df = pd.read_sql("SELECT * FROM anomalies ORDER BY day DESC", get_engine())
+    df['day'] = pd.to_datetime(df['day'])
+    return df
+
 if __name__ == "__main__":
     try:
         engine = create_engine(f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}')
@@ -1,5 +1,7 @@
+import argparse
 import pandas as pd
 import os
+from scripts import profiling
 
 
 def generate_sales_marketing_mapping(sales_cleaned_path, marketing_cleaned_path, output_path):
@@ -12,9 +14,21 @@ def generate_sales_marketing_mapping(sales_cleaned_path, marketing_cleaned_path,
     - output_path: Path where the sales_marketing.csv will be saved.
     """
     # Load the cleaned sales and marketing data
-    sales = pd.read_csv(sales_cleaned_path, parse_dates=['order_date'])
-    marketing = pd.read_csv(marketing_cleaned_path, parse_dates=['start_date', 'end_date'])
+    with profiling.stage('read_cleaned') as record:
+        sales = pd.read_csv(sales_cleaned_path, parse_dates=['order_date'])
+        marketing = pd.read_csv(marketing_cleaned_path, parse_dates=['start_date', 'end_date'])
+        record.rows_out = len(sales) + len(marketing)
 
+    sales_marketing = map_orders_to_campaigns(sales, marketing)
+
+    # Save the mapping to CSV
+    with profiling.stage('write_mapping', rows_in=len(sales_marketing)):
+        sales_marketing.to_csv(output_path, index=False)
+    print(f"sales_marketing.csv generated with {len(sales_marketing)} mappings at {output_path}.")
+
+
+@profiling.profiled()
+def map_orders_to_campaigns(sales, marketing):
     # Initialize an empty list to store mappings
     mappings = []
 
@@ -48,13 +62,18 @@ def generate_sales_marketing_mapping(sales_cleaned_path, marketing_cleaned_path,
 
     # Remove potential duplicates
     sales_marketing.drop_duplicates(inplace=True)
-
-    # Save the mapping to CSV
-    sales_marketing.to_csv(output_path, index=False)
-    print(f"sales_marketing.csv generated with {len(sales_marketing)} mappings at {output_path}.")
+    return sales_marketing
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Map orders to the campaigns active on their order date.")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    with profiling.run('data_mapping', args):
+        run_mapping()
+
+
+def run_mapping():
     # Define paths
     SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
     DATA_CLEANED_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'cleaned')
@@ -0,0 +1,196 @@
+"""
+This module shares one read-only copy of the dashboard's base tables per host.
+
+The current data version is materialised once as uncompressed Arrow IPC files
+under data/snapshots/<version>/. Every session and every worker process then
+memory-maps those files, so the pages live once in the OS page cache and pandas
+reads them without copying numeric and timestamp columns, which map to numpy
+views. String columns arrive dictionary-encoded from data_loading and are read
+back as pandas categories. When data_upload records a new data version,
+the next check materialises a new snapshot and swaps the CURRENT pointer
+atomically; readers pick it up on their next access.
+"""
+import fcntl
+import os
+import shutil
+import time
+import uuid
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import inspect
+from scripts.data_loading import load_sales_data, load_customer_data, load_product_data, load_marketing_data
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_ROOT = os.path.join(SCRIPT_DIR, '..', 'data', 'snapshots')
+CURRENT_POINTER = 'CURRENT'
+LOCK_FILE = '.lock'
+
+# How often (seconds) a process asks the database whether the data version changed
+VERSION_CHECK_SECONDS = 60
+# Snapshots kept on disk besides the current one (readers may still map them)
+KEEP_PREVIOUS = 1
+
+SNAPSHOT_LOADERS = {
+    'sales': load_sales_data,
+    'customers': load_customer_data,
+    'products': load_product_data,
+    'marketing': load_marketing_data,
+}
+
+_process_state = {'checked_at': 0.0, 'snapshot': None}
+
+
+def record_data_version(engine):
+    """
+    Stamps a new data version. Called by data_upload after the tables are replaced.
+    """
+    version = time.strftime('%Y%m%dT%H%M%S') + '-' + uuid.uuid4().hex[:8]
+    pd.DataFrame({'version': [version], 'updated_at': [pd.Timestamp.now()]}).to_sql(
+        'data_version', engine, if_exists='replace', index=False)
+    return version
+
+
+def get_data_version(engine):
+    """
+    Returns the version recorded by data_upload, or 'unversioned' if none has been
+    recorded yet. Database errors are raised, not mistaken for a new version.
+    """
+    if not inspect(engine).has_table('data_version'):
+        return 'unversioned'
+    return str(pd.read_sql("SELECT version FROM data_version", engine).iloc[0]['version'])
+
+
+def built_version(engine, state_table):
+    """
+    Returns the data version an incrementally refreshed table was last built from,
+    as recorded in the data_version column of its state table, or None if there is none.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(state_table):
+        return None
+    if 'data_version' not in {column['name'] for column in inspector.get_columns(state_table)}:
+        return None
+    return pd.read_sql(f"SELECT MAX(data_version) AS data_version FROM {state_table}",
+                       engine).iloc[0]['data_version']
+
+
+def _read_pointer(root):
+    try:
+        with open(os.path.join(root, CURRENT_POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _to_arrow(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Numeric() columns arrive as Decimal objects; store them as float64 so they map as numpy views
+    for i, field in enumerate(table.schema):
+        if pa.types.is_decimal(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    return table
+
+
+def materialize_snapshot(version, root=SNAPSHOT_ROOT, loaders=SNAPSHOT_LOADERS):
+    """
+    Writes every table of a data version as an Arrow IPC file and points CURRENT at it.
+    Only one process on the host materialises a given version; the others wait on the lock.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _read_pointer(root) == version:
+            return version
+
+        staging = os.path.join(root, f'.{version}.{os.getpid()}')
+        pointer_tmp = os.path.join(root, f'.{CURRENT_POINTER}.{os.getpid()}')
+        try:
+            os.makedirs(staging, exist_ok=True)
+            for name, loader in loaders.items():
+                table = _to_arrow(loader())
+                with pa.OSFile(os.path.join(staging, f'{name}.arrow'), 'wb') as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            target = os.path.join(root, version)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            os.rename(staging, target)
+
+            with open(pointer_tmp, 'w') as f:
+                f.write(version)
+            os.replace(pointer_tmp, os.path.join(root, CURRENT_POINTER))
+        finally:
+            # Left behind only when materialising failed
+            shutil.rmtree(staging, ignore_errors=True)
+            if os.path.exists(pointer_tmp):
+                os.remove(pointer_tmp)
+        _remove_old_snapshots(root, version)
+    print(f"Materialised data snapshot {version} at {target}.")
+    return version
+
+
+def _remove_old_snapshots(root, current):
+    snapshots = sorted(
+        (d for d in os.listdir(root) if not d.startswith('.') and d != CURRENT_POINTER and d != current),
+        key=lambda d: os.path.getmtime(os.path.join(root, d)),
+        reverse=True
+    )
+    # Unlinking is safe for processes that still map an old snapshot; pages are freed once they unmap
+    for stale in snapshots[KEEP_PREVIOUS:]:
+        shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+
+
+def _string_types(arrow_type):
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def open_snapshot(version, root=SNAPSHOT_ROOT):
+    """
+    Memory-maps a snapshot read-only.
+
+    Returns:
+    - snapshot: Dict with 'version' and 'tables' (table name -> read-only DataFrame).
+    """
+    tables = {}
+    directory = os.path.join(root, version)
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.arrow'):
+            continue
+        source = pa.memory_map(os.path.join(directory, file_name), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        tables[file_name[:-len('.arrow')]] = table.to_pandas(split_blocks=True, types_mapper=_string_types)
+    return {'version': version, 'tables': tables}
+
+
+def get_snapshot(engine, root=SNAPSHOT_ROOT, max_age=VERSION_CHECK_SECONDS):
+    """
+    Returns the current snapshot for this process, materialising or switching to
+    a newer one when the database reports a new data version. DataFrames are
+    shared by every caller in the process and must not be modified in place.
+    """
+    now = time.monotonic()
+    if now - _process_state['checked_at'] > max_age or _process_state['snapshot'] is None:
+        version = get_data_version(engine)
+        if _read_pointer(root) != version:
+            materialize_snapshot(version, root)
+        _process_state['checked_at'] = now
+
+    current = _read_pointer(root)
+    snapshot = _process_state['snapshot']
+    if snapshot is None or snapshot['version'] != current:
+        snapshot = open_snapshot(current, root)
+        _process_state['snapshot'] = snapshot
+    return snapshot
+
+
+def main():
+    from scripts.database import get_engine
+    engine = get_engine()
+    version = get_data_version(engine)
+    materialize_snapshot(version)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
+import argparse
 import pandas as pd
 from sqlalchemy import create_engine
 from sqlalchemy.types import Date, DateTime, Numeric, Integer, String
 from dotenv import load_dotenv
 import os
+from scripts.drill_down import create_drill_down_index
+from scripts.data_snapshot import record_data_version
+from scripts import profiling
 
 
 def load_environment_variables():
@@ -16,6 +20,9 @@ def load_environment_variables():
 
 
 def upload_dataframe_to_postgres(df, table_name, engine):
+    """
+    Replaces table_name with df. Returns False (after printing the error) if the upload failed.
+    """
     try:
         # Define dtype mapping based on table_name
         if table_name == 'sales':
@@ -60,13 +67,24 @@ def upload_dataframe_to_postgres(df, table_name, engine):
         else:
             dtype = {}
 
-        df.to_sql(table_name, engine, if_exists='replace', index=False, dtype=dtype)
+        with profiling.stage(f'upload_{table_name}', rows_in=len(df)):
+            df.to_sql(table_name, engine, if_exists='replace', index=False, dtype=dtype)
         print(f"Successfully uploaded {table_name} to PostgreSQL.")
+        return True
     except Exception as e:
         print(f"Error uploading {table_name}: {e}")
+        return False
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Upload the cleaned CSVs to PostgreSQL.")
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    with profiling.run('data_upload', args):
+        upload_all()
+
+
+def upload_all():
     db_user, db_password, db_host, db_port, db_name = load_environment_variables()
     try:
         engine = create_engine(f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}')
@@ -84,10 +102,12 @@ def main():
 
     # Load CSVs into DataFrames
     try:
-        sales_df = pd.read_csv(sales_csv, parse_dates=['order_date'])
-        customers_df = pd.read_csv(customers_csv, parse_dates=['signup_date', 'last_order_date'])
-        products_df = pd.read_csv(products_csv)
-        marketing_df = pd.read_csv(marketing_csv, parse_dates=['start_date', 'end_date'])
+        with profiling.stage('read_cleaned') as record:
+            sales_df = pd.read_csv(sales_csv, parse_dates=['order_date'])
+            customers_df = pd.read_csv(customers_csv, parse_dates=['signup_date', 'last_order_date'])
+            products_df = pd.read_csv(products_csv)
+            marketing_df = pd.read_csv(marketing_csv, parse_dates=['start_date', 'end_date'])
+            record.rows_out = profiling.row_count((sales_df, customers_df, products_df, marketing_df))
     except FileNotFoundError as e:
         print(f"Error reading CSV files: {e}")
         exit(1)
@@ -96,10 +116,24 @@ def main():
         exit(1)
 
     # Upload DataFrames to PostgreSQL
-    upload_dataframe_to_postgres(sales_df, 'sales', engine)
-    upload_dataframe_to_postgres(customers_df, 'customers', engine)
-    upload_dataframe_to_postgres(products_df, 'products', engine)
-    upload_dataframe_to_postgres(marketing_df, 'marketing', engine)
+    uploads = {'sales': sales_df, 'customers': customers_df, 'products': products_df, 'marketing': marketing_df}
+    failed = [name for name, df in uploads.items() if not upload_dataframe_to_postgres(df, name, engine)]
+    if failed:
+        # Exit non-zero so the pipeline does not checkpoint a partial upload, and keep the old data version
+        print(f"Upload failed for: {', '.join(failed)}")
+        exit(1)
+
+    # Tables are replaced on upload, so indexes have to be recreated
+    try:
+        with profiling.stage('create_drill_down_index'):
+            create_drill_down_index(engine)
+        print("Created drill-down index on sales (order_date, order_id).")
+    except Exception as e:
+        print(f"Error creating drill-down index: {e}")
+
+    # Dashboards rebuild their shared snapshot when they see a new version
+    version = record_data_version(engine)
+    print(f"Recorded data version {version}.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+"""
+This module validates cleaned data before it is saved or uploaded.
+Rules are declared per table and evaluated as whole-column masks, so the cost
+is a handful of hash lookups and comparisons per rule regardless of row count.
+Rows breaking any rule are written to data/quarantine/ with their reason codes.
+
+Comparisons with a missing value are False, so range rules do not catch nulls;
+every range-checked column has its own MISSING_<COLUMN> rule. Order rules skip
+rows where either date is missing (e.g. customers without orders).
+"""
+import os
+import numpy as np
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+QUARANTINE_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'quarantine')
+
+# Absolute tolerance when comparing total_price against quantity * price
+PRICE_TOLERANCE = 0.01
+
+PRODUCT_RULES = [
+    {'reason': 'DUPLICATE_PRODUCT_ID', 'type': 'unique', 'columns': ['product_id']},
+    {'reason': 'MISSING_PRICE', 'type': 'not_null', 'columns': ['price']},
+    {'reason': 'NON_POSITIVE_PRICE', 'type': 'range', 'column': 'price', 'min': 0, 'inclusive': False},
+    {'reason': 'MISSING_STOCK', 'type': 'not_null', 'columns': ['stock']},
+    {'reason': 'NEGATIVE_STOCK', 'type': 'range', 'column': 'stock', 'min': 0},
+]
+
+CUSTOMER_RULES = [
+    {'reason': 'DUPLICATE_CUSTOMER_ID', 'type': 'unique', 'columns': ['customer_id']},
+    {'reason': 'LAST_ORDER_BEFORE_SIGNUP', 'type': 'order', 'columns': ['signup_date', 'last_order_date']},
+    {'reason': 'MISSING_CLV', 'type': 'not_null', 'columns': ['CLV']},
+    {'reason': 'NEGATIVE_CLV', 'type': 'range', 'column': 'CLV', 'min': 0},
+]
+
+MARKETING_RULES = [
+    {'reason': 'DUPLICATE_CAMPAIGN_ID', 'type': 'unique', 'columns': ['campaign_id']},
+    {'reason': 'END_BEFORE_START', 'type': 'order', 'columns': ['start_date', 'end_date']},
+    {'reason': 'MISSING_SPEND', 'type': 'not_null', 'columns': ['spend']},
+    {'reason': 'NEGATIVE_SPEND', 'type': 'range', 'column': 'spend', 'min': 0},
+    {'reason': 'MISSING_CONVERSIONS', 'type': 'not_null', 'columns': ['conversions']},
+    {'reason': 'NEGATIVE_CONVERSIONS', 'type': 'range', 'column': 'conversions', 'min': 0},
+]
+
+SALES_RULES = [
+    {'reason': 'DUPLICATE_ORDER_ID', 'type': 'unique', 'columns': ['order_id']},
+    {'reason': 'UNKNOWN_CUSTOMER', 'type': 'foreign_key', 'column': 'customer_id',
+     'ref_table': 'customers', 'ref_column': 'customer_id'},
+    {'reason': 'UNKNOWN_PRODUCT', 'type': 'foreign_key', 'column': 'product_id',
+     'ref_table': 'products', 'ref_column': 'product_id'},
+    {'reason': 'MISSING_QUANTITY', 'type': 'not_null', 'columns': ['quantity']},
+    {'reason': 'NON_POSITIVE_QUANTITY', 'type': 'range', 'column': 'quantity', 'min': 0, 'inclusive': False},
+    {'reason': 'MISSING_TOTAL_PRICE', 'type': 'not_null', 'columns': ['total_price']},
+    {'reason': 'NEGATIVE_TOTAL_PRICE', 'type': 'range', 'column': 'total_price', 'min': 0},
+    {'reason': 'TOTAL_PRICE_MISMATCH', 'type': 'consistency', 'column': 'total_price', 'factor': 'quantity',
+     'key': 'product_id', 'ref_table': 'products', 'ref_column': 'product_id', 'ref_value': 'price',
+     'tolerance': PRICE_TOLERANCE},
+]
+
+
+def _unique_mask(df, rule):
+    # Keeps the first occurrence and flags every later repeat of the key
+    return df.duplicated(subset=rule['columns'], keep='first').to_numpy()
+
+
+def _foreign_key_mask(df, rule, references):
+    ref_values = pd.Index(references[rule['ref_table']][rule['ref_column']].unique())
+    return ~df[rule['column']].isin(ref_values).to_numpy()
+
+
+def _not_null_mask(df, rule):
+    return df[rule['columns']].isna().any(axis=1).to_numpy()
+
+
+def _range_mask(df, rule):
+    values = df[rule['column']]
+    mask = np.zeros(len(df), dtype=bool)
+    inclusive = rule.get('inclusive', True)
+    if 'min' in rule:
+        mask |= (values < rule['min'] if inclusive else values <= rule['min']).to_numpy()
+    if 'max' in rule:
+        mask |= (values > rule['max'] if inclusive else values >= rule['max']).to_numpy()
+    return mask
+
+
+def _order_mask(df, rule):
+    first, second = rule['columns']
+    return (df[second] < df[first]).to_numpy()
+
+
+def _consistency_mask(df, rule, references):
+    ref = references[rule['ref_table']].drop_duplicates(subset=rule['ref_column'])
+    lookup = ref.set_index(rule['ref_column'])[rule['ref_value']]
+    expected = df[rule['factor']] * df[rule['key']].map(lookup)
+    # Rows with no lookup value are left to the foreign key rule
+    return ((df[rule['column']] - expected).abs() > rule['tolerance']).to_numpy()
+
+
+def evaluate_rules(df, rules, references=None):
+    """
+    Evaluates every rule against the DataFrame.
+
+    Parameters:
+    - df: DataFrame to validate.
+    - rules: List of rule dicts (see the *_RULES constants).
+    - references: Dict of already validated DataFrames used by foreign key and consistency rules.
+
+    Returns:
+    - masks: Dict mapping each rule's reason code to a boolean array of failing rows.
+    """
+    references = references or {}
+    masks = {}
+    for rule in rules:
+        rule_type = rule['type']
+        if rule_type == 'unique':
+            mask = _unique_mask(df, rule)
+        elif rule_type == 'foreign_key':
+            mask = _foreign_key_mask(df, rule, references)
+        elif rule_type == 'not_null':
+            mask = _not_null_mask(df, rule)
+        elif rule_type == 'range':
+            mask = _range_mask(df, rule)
+        elif rule_type == 'order':
+            mask = _order_mask(df, rule)
+        elif rule_type == 'consistency':
+            mask = _consistency_mask(df, rule, references)
+        else:
+            raise ValueError(f"Unknown validation rule type: {rule_type}")
+        masks[rule['reason']] = mask
+    return masks
+
+
+def validate_dataframe(df, rules, references=None):
+    """
+    Splits a DataFrame into valid rows and quarantined rows.
+
+    Returns:
+    - valid_df: Rows that pass every rule.
+    - quarantined_df: Failing rows with a 'reason' column listing every broken rule, separated by '|'.
+    """
+    masks = evaluate_rules(df, rules, references)
+    bad = np.zeros(len(df), dtype=bool)
+    for mask in masks.values():
+        bad |= mask
+
+    valid_df = df[~bad]
+    quarantined_df = df[bad].copy()
+    if bad.any():
+        # Reason strings are only built for the (small) failing subset
+        reasons = np.full(int(bad.sum()), '', dtype=object)
+        for reason, mask in masks.items():
+            hit = mask[bad]
+            reasons[hit] = reasons[hit] + reason + '|'
+        quarantined_df['reason'] = pd.Series(reasons, index=quarantined_df.index).str.rstrip('|')
+    else:
+        quarantined_df['reason'] = pd.Series(dtype=object)
+    return valid_df, quarantined_df
+
+
+def write_quarantine(quarantined_df, table_name, quarantine_dir=QUARANTINE_DIR):
+    os.makedirs(quarantine_dir, exist_ok=True)
+    output_path = os.path.join(quarantine_dir, f'{table_name}_quarantine.csv')
+    quarantined_df.to_csv(output_path, index=False)
+    if not quarantined_df.empty:
+        counts = quarantined_df['reason'].str.split('|').explode().value_counts()
+        summary = ", ".join(f"{reason}={count}" for reason, count in counts.items())
+        print(f"Quarantined {len(quarantined_df)} {table_name} rows ({summary}) at {output_path}.")
+    return output_path
+
+
+def validate_all(sales, customers, products, marketing, quarantine_dir=QUARANTINE_DIR):
+    """
+    Validates all tables in dependency order, so sales are checked against
+    customers and products that have already passed their own rules.
+
+    Returns:
+    - sales, customers, products, marketing: Valid rows of each table.
+    """
+    products, products_bad = validate_dataframe(products, PRODUCT_RULES)
+    customers, customers_bad = validate_dataframe(customers, CUSTOMER_RULES)
+    marketing, marketing_bad = validate_dataframe(marketing, MARKETING_RULES)
+    references = {'customers': customers, 'products': products}
+    sales, sales_bad = validate_dataframe(sales, SALES_RULES, references)
+
+    write_quarantine(products_bad, 'products', quarantine_dir)
+    write_quarantine(customers_bad, 'customers', quarantine_dir)
+    write_quarantine(marketing_bad, 'marketing', quarantine_dir)
+    write_quarantine(sales_bad, 'sales', quarantine_dir)
+
+    return sales, customers, products, marketing
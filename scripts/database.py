@@ -1,14 +1,19 @@
 """
 This module handles the creation of a SQLAlchemy engine from environment variables.
-Call get_engine() to get a connected engine.
+Call get_engine() to get a connected engine. The engine is created on first call
+and shared afterwards; SQLAlchemy itself is only imported at that point, and no
+connection is opened until a query runs.
 """
 import os
-from sqlalchemy import create_engine
+from functools import lru_cache
 from dotenv import load_dotenv
 
 load_dotenv()
 
+@lru_cache(maxsize=None)
 def get_engine():
+    from sqlalchemy import create_engine
+
     db_user = os.getenv('DB_USER')
     db_password = os.getenv('DB_PASSWORD')
     db_host = os.getenv('DB_HOST')
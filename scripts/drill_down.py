@@ -0,0 +1,132 @@
+"""
+This module provides keyset-paginated queries for the campaign drill-down.
+Pages are fetched with a (order_date, order_id) cursor instead of OFFSET, so
+every page costs the same index range scan no matter how deep the user pages.
+Run create_drill_down_index() once after uploading sales to back the cursor.
+"""
+import json
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+SORT_ORDERS = {
+    "Oldest first": "ASC",
+    "Newest first": "DESC",
+}
+
+PAGE_SIZES = [25, 50, 100, 250]
+
+SALES_COLUMNS = "s.order_id, s.customer_id, s.product_id, s.quantity, s.total_price, s.order_date"
+
+
+def create_drill_down_index(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_sales_order_date_order_id ON sales (order_date, order_id)"
+        ))
+
+
+def _build_where(campaign_name, start_date=None, end_date=None, product_ids=None,
+                 segments=None, campaigns=None):
+    """
+    Builds the WHERE clause selecting the orders placed while a campaign was active,
+    restricted by the dashboard's sidebar filters.
+
+    Returns:
+    - clauses: List of SQL conditions to AND together.
+    - params: Bind parameters for the conditions.
+    - expanding: Names of list parameters that must be bound as expanding IN lists.
+    """
+    clauses = ["""EXISTS (
+        SELECT 1 FROM marketing m
+        WHERE m.campaign_name = :campaign_name
+          AND s.order_date BETWEEN m.start_date AND m.end_date
+    )"""]
+    params = {'campaign_name': campaign_name}
+    expanding = []
+
+    if start_date and end_date:
+        clauses.append("s.order_date BETWEEN :start_date AND :end_date")
+        params.update(start_date=start_date, end_date=end_date)
+    if product_ids:
+        clauses.append("s.product_id IN :product_ids")
+        params['product_ids'] = list(product_ids)
+        expanding.append('product_ids')
+    if segments:
+        clauses.append("s.customer_id IN (SELECT customer_id FROM customers WHERE segment IN :segments)")
+        params['segments'] = list(segments)
+        expanding.append('segments')
+    if campaigns:
+        clauses.append("""EXISTS (
+            SELECT 1 FROM marketing mf
+            WHERE mf.campaign_name IN :campaigns
+              AND s.order_date BETWEEN mf.start_date AND mf.end_date
+        )""")
+        params['campaigns'] = list(campaigns)
+        expanding.append('campaigns')
+    return clauses, params, expanding
+
+
+def _bind(sql, expanding):
+    statement = text(sql)
+    if expanding:
+        statement = statement.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+    return statement
+
+
+def fetch_campaign_sales_page(engine, campaign_name, after=None, sort_order="ASC", page_size=50, **filters):
+    """
+    Fetches one page of sales related to a campaign.
+
+    Parameters:
+    - engine: SQLAlchemy engine.
+    - campaign_name: Campaign to drill into.
+    - after: Cursor (order_date, order_id) of the last row on the previous page, or None for the first page.
+    - sort_order: 'ASC' or 'DESC' on (order_date, order_id).
+    - page_size: Number of rows to return.
+    - filters: start_date, end_date, product_ids, segments, campaigns.
+
+    Returns:
+    - page_df: DataFrame with at most page_size rows.
+    - next_cursor: Cursor for the following page, or None if this is the last page.
+    """
+    sort_order = "DESC" if sort_order == "DESC" else "ASC"
+    clauses, params, expanding = _build_where(campaign_name, **filters)
+    if after is not None:
+        comparison = "<" if sort_order == "DESC" else ">"
+        clauses.append(f"(s.order_date, s.order_id) {comparison} (:after_date, :after_id)")
+        params.update(after_date=after[0], after_id=after[1])
+    # One extra row tells us whether another page exists without a COUNT
+    params['limit'] = page_size + 1
+
+    sql = f"""
+        SELECT {SALES_COLUMNS}
+        FROM sales s
+        WHERE {' AND '.join(clauses)}
+        ORDER BY s.order_date {sort_order}, s.order_id {sort_order}
+        LIMIT :limit
+    """
+    with engine.connect() as conn:
+        page_df = pd.read_sql(_bind(sql, expanding), conn, params=params)
+
+    next_cursor = None
+    if len(page_df) > page_size:
+        page_df = page_df.iloc[:page_size].copy()
+        last = page_df.iloc[-1]
+        next_cursor = (last['order_date'], int(last['order_id']))
+    page_df['order_date'] = pd.to_datetime(page_df['order_date'])
+    return page_df, next_cursor
+
+
+def estimate_campaign_sales_count(engine, campaign_name, **filters):
+    """
+    Returns the planner's row estimate for the drill-down query. This reads
+    statistics only, so it stays instant where an exact COUNT(*) would scan
+    every matching order.
+    """
+    clauses, params, expanding = _build_where(campaign_name, **filters)
+    sql = f"EXPLAIN (FORMAT JSON) SELECT 1 FROM sales s WHERE {' AND '.join(clauses)}"
+    with engine.connect() as conn:
+        plan = conn.execute(_bind(sql, expanding), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
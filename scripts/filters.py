@@ -1,30 +1,45 @@
 """
 This module contains functions to filter the sales data based on user selections.
+The sales table is only read, so it can be a table shared between sessions
+(e.g. the memory-mapped snapshot); callers must not modify the result in place.
 """
+import numpy as np
 import pandas as pd
 
-def apply_filters(sales_df, product_df, customer_df, marketing_df,
-                  start_date, end_date, selected_products, selected_segments, selected_campaigns):
-    filtered = sales_df.copy()
+def filter_mask(sales_df, product_df, customer_df, marketing_df,
+                start_date, end_date, selected_products, selected_segments, selected_campaigns):
+    """
+    Returns a boolean array over the rows of sales_df matching the selections,
+    or None when no filter is active.
+    """
+    conditions = []
 
     if start_date and end_date:
-        filtered = filtered[(filtered['order_date'] >= pd.to_datetime(start_date)) &
-                            (filtered['order_date'] <= pd.to_datetime(end_date))]
+        conditions.append(sales_df['order_date'].between(pd.to_datetime(start_date), pd.to_datetime(end_date)))
 
     if 'All' not in selected_products:
         valid_pids = product_df[product_df['product_name'].isin(selected_products)]['product_id']
-        filtered = filtered[filtered['product_id'].isin(valid_pids)]
+        conditions.append(sales_df['product_id'].isin(valid_pids))
 
     if 'All' not in selected_segments:
         valid_cids = customer_df[customer_df['segment'].isin(selected_segments)]['customer_id']
-        filtered = filtered[filtered['customer_id'].isin(valid_cids)]
+        conditions.append(sales_df['customer_id'].isin(valid_cids))
 
     if 'All' not in selected_campaigns:
         try:
             sales_marketing = pd.read_csv("data/cleaned/sales_marketing.csv")
             valid_oids = sales_marketing[sales_marketing['campaign_name'].isin(selected_campaigns)]['order_id']
-            filtered = filtered[filtered['order_id'].isin(valid_oids)]
+            conditions.append(sales_df['order_id'].isin(valid_oids))
         except FileNotFoundError:
             pass
 
-    return filtered
\ No newline at end of file
+    if not conditions:
+        return None
+    return np.logical_and.reduce([condition.to_numpy(dtype=bool) for condition in conditions])
+
+def apply_filters(sales_df, product_df, customer_df, marketing_df,
+                  start_date, end_date, selected_products, selected_segments, selected_campaigns):
+    mask = filter_mask(sales_df, product_df, customer_df, marketing_df, start_date, end_date,
+                       selected_products, selected_segments, selected_campaigns)
+    # Without active filters the input itself is returned, not a copy
+    return sales_df if mask is None else sales_df[mask]
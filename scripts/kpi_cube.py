@@ -0,0 +1,195 @@
+"""
+This module builds the kpi_cube table: additive KPI measures for every
+combination of segment x product x campaign x month, including the 'All'
+roll-ups, computed in a single CUBE query inside PostgreSQL.
+
+Measures:
+- revenue, orders, customers from sales. Orders whose customer or product is
+  unknown are kept under the 'Unknown' segment or product. An order placed
+  while several campaigns ran is attributed in full (revenue and counts) to
+  each of them; the campaign = 'All' rows count every order once.
+- spend, conversions, impressions from marketing, spread evenly over each
+  campaign's days, and new_customers: customers who signed up in the month,
+  attributed in full to each campaign running on their signup day. They do not
+  depend on segment or product and are only stored on the segment = product = 'All'
+  rows, so marketing ratios (CAC, conversion rate) are only defined there.
+
+Any slice is then answered by lookup (lookup_slice) and ratio arithmetic
+(kpi_calculations.calculate_slice_kpis) without touching sales. Lookups of
+'All' or a single member per dimension are exact. When several members are
+summed, customer counts are an upper bound, and so are all sales and signup
+measures summed over campaigns that overlap in time.
+"""
+import itertools
+from sqlalchemy import text
+from scripts.database import get_engine
+
+CUBE_DIMENSIONS = ['segment', 'product', 'campaign', 'month']
+SALES_MEASURES = ['revenue', 'orders', 'customers']
+CAMPAIGN_MEASURES = ['spend', 'conversions', 'impressions', 'new_customers']
+ALL = 'All'
+
+KPI_CUBE_QUERY = """
+    WITH order_campaigns AS (
+        -- One row per order and campaign, even when rows of the same campaign overlap
+        SELECT order_id, campaign_name,
+               COUNT(*) OVER (PARTITION BY order_id) AS campaign_count
+        FROM (
+            SELECT DISTINCT s.order_id, m.campaign_name
+            FROM sales s
+            JOIN marketing m ON s.order_date BETWEEN m.start_date AND m.end_date
+        ) AS covered
+    ),
+    facts AS (
+        SELECT
+            s.order_id,
+            s.customer_id,
+            s.total_price,
+            s.total_price / COALESCE(oc.campaign_count, 1) AS revenue_share,
+            COALESCE(c.segment, 'Unknown') AS segment,
+            COALESCE(p.product_name, 'Unknown') AS product,
+            COALESCE(oc.campaign_name, 'No Campaign') AS campaign,
+            TO_CHAR(s.order_date, 'YYYY-MM') AS month
+        FROM sales s
+        -- Outer joins keep every order in the totals, as in the headline KPIs
+        LEFT JOIN customers c ON c.customer_id = s.customer_id
+        LEFT JOIN products p ON p.product_id = s.product_id
+        LEFT JOIN order_campaigns oc ON oc.order_id = s.order_id
+    ),
+    sales_cube AS (
+        SELECT
+            CASE WHEN GROUPING(segment) = 1 THEN 'All' ELSE segment END AS segment,
+            CASE WHEN GROUPING(product) = 1 THEN 'All' ELSE product END AS product,
+            CASE WHEN GROUPING(campaign) = 1 THEN 'All' ELSE campaign END AS campaign,
+            CASE WHEN GROUPING(month) = 1 THEN 'All' ELSE month END AS month,
+            -- Full revenue per campaign; the shares add up to each order's revenue once across campaigns
+            (CASE WHEN GROUPING(campaign) = 1 THEN SUM(revenue_share) ELSE SUM(total_price) END)::float8 AS revenue,
+            COUNT(DISTINCT order_id) AS orders,
+            COUNT(DISTINCT customer_id) AS customers
+        FROM facts
+        GROUP BY CUBE (segment, product, campaign, month)
+    ),
+    campaign_days AS (
+        SELECT
+            m.campaign_name AS campaign,
+            TO_CHAR(d, 'YYYY-MM') AS month,
+            m.spend::float8 / (m.end_date - m.start_date + 1) AS spend,
+            m.conversions::float8 / (m.end_date - m.start_date + 1) AS conversions,
+            m.impressions::float8 / (m.end_date - m.start_date + 1) AS impressions
+        FROM marketing m
+        CROSS JOIN LATERAL generate_series(m.start_date, m.end_date, INTERVAL '1 day') AS d
+    ),
+    marketing_cube AS (
+        SELECT
+            'All' AS segment,
+            'All' AS product,
+            CASE WHEN GROUPING(campaign) = 1 THEN 'All' ELSE campaign END AS campaign,
+            CASE WHEN GROUPING(month) = 1 THEN 'All' ELSE month END AS month,
+            SUM(spend) AS spend,
+            SUM(conversions) AS conversions,
+            SUM(impressions) AS impressions
+        FROM campaign_days
+        GROUP BY CUBE (campaign, month)
+    ),
+    signups AS (
+        SELECT
+            c.customer_id,
+            COALESCE(m.campaign_name, 'No Campaign') AS campaign,
+            TO_CHAR(c.signup_date, 'YYYY-MM') AS month
+        FROM customers c
+        LEFT JOIN marketing m ON c.signup_date BETWEEN m.start_date AND m.end_date
+        WHERE c.signup_date IS NOT NULL
+    ),
+    signup_cube AS (
+        SELECT
+            'All' AS segment,
+            'All' AS product,
+            CASE WHEN GROUPING(campaign) = 1 THEN 'All' ELSE campaign END AS campaign,
+            CASE WHEN GROUPING(month) = 1 THEN 'All' ELSE month END AS month,
+            COUNT(DISTINCT customer_id) AS new_customers
+        FROM signups
+        GROUP BY CUBE (campaign, month)
+    )
+    SELECT
+        segment, product, campaign, month,
+        COALESCE(sc.revenue, 0) AS revenue,
+        COALESCE(sc.orders, 0) AS orders,
+        COALESCE(sc.customers, 0) AS customers,
+        mc.spend,
+        mc.conversions,
+        mc.impressions,
+        su.new_customers
+    FROM sales_cube sc
+    FULL JOIN marketing_cube mc USING (segment, product, campaign, month)
+    FULL JOIN signup_cube su USING (segment, product, campaign, month)
+"""
+
+
+def build_kpi_cube(engine):
+    """
+    Rebuilds kpi_cube inside the database and swaps it in atomically.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS kpi_cube_build"))
+        conn.execute(text(f"CREATE TABLE kpi_cube_build AS {KPI_CUBE_QUERY}"))
+        conn.execute(text("DROP TABLE IF EXISTS kpi_cube"))
+        conn.execute(text("ALTER TABLE kpi_cube_build RENAME TO kpi_cube"))
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS idx_kpi_cube_slice "
+                          "ON kpi_cube (segment, product, campaign, month)"))
+        rows = conn.execute(text("SELECT COUNT(*) FROM kpi_cube")).scalar()
+    print(f"Built kpi_cube with {rows} rows.")
+    return rows
+
+
+def index_cube(cube_df):
+    """
+    Indexes the cube rows by the dimensions for lookups; missing measures become 0.
+    """
+    measures = SALES_MEASURES + CAMPAIGN_MEASURES
+    return cube_df.set_index(CUBE_DIMENSIONS)[measures].astype(float).fillna(0.0).sort_index()
+
+
+def _members(value):
+    if value is None:
+        return [ALL]
+    if isinstance(value, str):
+        return [value]
+    members = list(value)
+    return [ALL] if ALL in members else members
+
+
+def lookup_slice(cube, segment=ALL, product=ALL, campaign=ALL, month=ALL):
+    """
+    Sums the measures of a slice of an indexed cube (see index_cube).
+
+    Parameters:
+    - cube: Indexed cube.
+    - segment, product, campaign, month: 'All', a member, or a list of members ('YYYY-MM' for months).
+
+    Returns:
+    - measures: Dict of measure name -> value. Campaign measures come from the
+      segment = product = 'All' rows and are None when segment or product is narrowed.
+    """
+    segments, products, campaigns, months = (_members(v) for v in (segment, product, campaign, month))
+    sales_keys = list(itertools.product(segments, products, campaigns, months))
+    sales = cube.reindex(sales_keys)[SALES_MEASURES].sum().to_dict()
+    if segments != [ALL] or products != [ALL]:
+        return {**sales, **dict.fromkeys(CAMPAIGN_MEASURES)}
+    campaign_keys = list(itertools.product([ALL], [ALL], campaigns, months))
+    return {**sales, **cube.reindex(campaign_keys)[CAMPAIGN_MEASURES].sum().to_dict()}
+
+
+def cube_members(cube, dimension):
+    """
+    Members of a dimension, without the 'All' roll-up.
+    """
+    members = cube.index.get_level_values(dimension).unique()
+    return sorted(member for member in members if member != ALL)
+
+
+def main():
+    build_kpi_cube(get_engine())
+
+
+if __name__ == "__main__":
+    main()
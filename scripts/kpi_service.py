@@ -0,0 +1,315 @@
+"""
+This module serves the dashboard's KPIs and aggregates as a read-only HTTP/JSON API,
+so other services do not have to render the Streamlit app or re-implement its SQL.
+
+Endpoints (GET):
+    /kpis        Headline KPIs (kpi_calculations, computed once per data version)
+                 and the filtered sales summary
+    /timeseries  Sales and orders per period, freq=D|W|M|Q|Y (default M)
+    /products    Revenue and quantity sold per product
+    /campaigns   Campaign performance for model=all_touch|first_touch|last_touch|linear
+    /health      Data version and cache statistics
+
+Filter parameters, as in the dashboard sidebar:
+    start_date, end_date          ISO dates (both are needed to filter by date)
+    product, segment, campaign    Names, repeatable (?segment=Premium&segment=Basic)
+
+Aggregates are computed from the shared memory-mapped snapshot (scripts.data_snapshot)
+and cached per (data version, endpoint, parameters). Each response carries an
+ETag, so a client repeating a request with If-None-Match gets 304 Not Modified
+until the data version changes. Cache hits never leave the event loop; misses
+are computed on a thread pool and concurrent identical misses share one computation.
+
+Usage (from the project root):
+    python -m scripts.kpi_service [--port 8600] [--cache-size 1024] [--threads 4]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import pandas as pd
+import tornado.ioloop
+import tornado.web
+from sqlalchemy import inspect
+from scripts.campaign_attribution import ATTRIBUTION_MODELS
+from scripts.data_snapshot import VERSION_CHECK_SECONDS, get_snapshot
+from scripts.data_loading import load_campaign_performance
+from scripts.filters import apply_filters
+from scripts.kpi_calculations import (
+    calculate_all_kpis,
+    calculate_sales_summary,
+    calculate_product_performance,
+    calculate_sales_time_series
+)
+
+TIME_SERIES_FREQS = ['D', 'W', 'M', 'Q', 'Y']
+
+FILTER_PARAMS = ('start_date', 'end_date', 'product', 'segment', 'campaign')
+ENDPOINT_PARAMS = {
+    'kpis': (),
+    'timeseries': ('freq',),
+    'products': (),
+    'campaigns': ('model',),
+}
+SINGLE_VALUE_PARAMS = ('start_date', 'end_date', 'freq', 'model')
+
+
+def parse_params(arguments, endpoint):
+    """
+    Validates query arguments and normalises them into a hashable cache key part.
+
+    Returns:
+    - params: Sorted tuple of (name, tuple of values).
+    Raises ValueError for unknown or malformed parameters.
+    """
+    allowed = FILTER_PARAMS + ENDPOINT_PARAMS[endpoint]
+    params = {}
+    for name, raw_values in arguments.items():
+        if name not in allowed:
+            raise ValueError(f"Unknown parameter '{name}' for /{endpoint}.")
+        values = sorted({value.decode('utf-8') for value in raw_values})
+        if name in SINGLE_VALUE_PARAMS and len(values) > 1:
+            raise ValueError(f"Parameter '{name}' takes a single value.")
+        params[name] = tuple(values)
+
+    for name in ('start_date', 'end_date'):
+        if name in params:
+            try:
+                date.fromisoformat(params[name][0])
+            except ValueError:
+                raise ValueError(f"Parameter '{name}' must be an ISO date (YYYY-MM-DD).")
+    if 'freq' in params and params['freq'][0] not in TIME_SERIES_FREQS:
+        raise ValueError(f"Parameter 'freq' must be one of {', '.join(TIME_SERIES_FREQS)}.")
+    if 'model' in params and params['model'][0] not in ATTRIBUTION_MODELS:
+        raise ValueError(f"Parameter 'model' must be one of {', '.join(ATTRIBUTION_MODELS)}.")
+    return tuple(sorted(params.items()))
+
+
+def _single(params, name, default=None):
+    return params[name][0] if name in params else default
+
+
+def _records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+
+def filter_sales(tables, params):
+    return apply_filters(tables['sales'], tables['products'], tables['customers'], tables['marketing'],
+                         _single(params, 'start_date'), _single(params, 'end_date'),
+                         list(params.get('product', ('All',))),
+                         list(params.get('segment', ('All',))),
+                         list(params.get('campaign', ('All',))))
+
+
+def _numbers(values):
+    return {name: (float(value) if pd.notnull(value) else None) for name, value in values.items()}
+
+
+_headline_kpis = {}
+_headline_lock = threading.Lock()
+
+
+def headline_kpis(engine, version):
+    """
+    calculate_all_kpis for a data version. It runs full-table queries and does not
+    depend on the filters, so it is computed once per version; concurrent callers wait for it.
+    """
+    with _headline_lock:
+        if version not in _headline_kpis:
+            kpis = _numbers(calculate_all_kpis(engine))
+            _headline_kpis.clear()
+            _headline_kpis[version] = kpis
+        return _headline_kpis[version]
+
+
+def kpis_endpoint(engine, snapshot, params):
+    summary = calculate_sales_summary(filter_sales(snapshot['tables'], params))
+    return {
+        'kpis': headline_kpis(engine, snapshot['version']),
+        'filtered': _numbers(summary),
+    }
+
+
+def timeseries_endpoint(engine, snapshot, params):
+    sales = filter_sales(snapshot['tables'], params)
+    return _records(calculate_sales_time_series(sales, _single(params, 'freq', 'M')))
+
+
+def products_endpoint(engine, snapshot, params):
+    tables = snapshot['tables']
+    return _records(calculate_product_performance(filter_sales(tables, params), tables['products']))
+
+
+def campaigns_endpoint(engine, snapshot, params):
+    """
+    Attributed campaign performance (precomputed over all sales by scripts/campaign_attribution.py).
+    Filters select campaigns: by name, and by date window overlapping start_date..end_date.
+    Falls back to the marketing table only while attribution has not been computed;
+    other errors (e.g. a failed connection) are raised.
+    """
+    if inspect(engine).has_table('campaign_performance'):
+        campaigns = load_campaign_performance(_single(params, 'model', 'all_touch'))
+    else:
+        campaigns = snapshot['tables']['marketing']
+    if 'campaign' in params:
+        campaigns = campaigns[campaigns['campaign_name'].isin(params['campaign'])]
+    start_date, end_date = _single(params, 'start_date'), _single(params, 'end_date')
+    if start_date and end_date:
+        campaigns = campaigns[(campaigns['start_date'] <= pd.to_datetime(end_date)) &
+                              (campaigns['end_date'] >= pd.to_datetime(start_date))]
+    return _records(campaigns)
+
+
+ENDPOINTS = {
+    'kpis': kpis_endpoint,
+    'timeseries': timeseries_endpoint,
+    'products': products_endpoint,
+    'campaigns': campaigns_endpoint,
+}
+
+
+class KPIService:
+    """
+    Holds the current snapshot and the result cache shared by all handlers.
+    """
+
+    def __init__(self, engine, cache_size=1024, threads=4):
+        self.engine = engine
+        self.cache_size = cache_size
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.snapshot = None
+        self.hits = 0
+        self.misses = 0
+
+    async def refresh_snapshot(self):
+        loop = tornado.ioloop.IOLoop.current()
+        snapshot = await loop.run_in_executor(self.executor, lambda: get_snapshot(self.engine, max_age=0))
+        if self.snapshot is None or snapshot['version'] != self.snapshot['version']:
+            # Entries of the previous version can never be hit again
+            self.cache.clear()
+            print(f"Serving data version {snapshot['version']}.")
+        self.snapshot = snapshot
+
+    def compute(self, snapshot, endpoint, params):
+        data = ENDPOINTS[endpoint](self.engine, snapshot, dict(params))
+        payload = {
+            'data_version': snapshot['version'],
+            'endpoint': endpoint,
+            'params': {name: list(values) for name, values in params},
+            'data': data,
+        }
+        return json.dumps(payload, default=str).encode('utf-8')
+
+    async def result(self, endpoint, params):
+        """
+        Returns the cache entry ({'body', 'etag'}) for a request, computing it on a miss.
+        """
+        snapshot = self.snapshot
+        key = (snapshot['version'], endpoint, params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        if key not in self.pending:
+            loop = tornado.ioloop.IOLoop.current()
+            self.pending[key] = loop.run_in_executor(self.executor, self.compute, snapshot, endpoint, params)
+        try:
+            body = await self.pending[key]
+        finally:
+            self.pending.pop(key, None)
+
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = {'body': body, 'etag': f'"{hashlib.sha1(body).hexdigest()}"'}
+            self.cache[key] = entry
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return entry
+
+
+class JSONHandler(tornado.web.RequestHandler):
+    def write_error(self, status_code, **kwargs):
+        message = self._reason
+        if 'exc_info' in kwargs and status_code >= 500:
+            message = f"{type(kwargs['exc_info'][1]).__name__}: {kwargs['exc_info'][1]}"
+        self.finish({'error': message})
+
+
+class AggregateHandler(JSONHandler):
+    def initialize(self, service, endpoint):
+        self.service = service
+        self.endpoint = endpoint
+
+    async def get(self):
+        try:
+            params = parse_params(self.request.query_arguments, self.endpoint)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400, reason=str(e))
+
+        entry = await self.service.result(self.endpoint, params)
+        self.set_header('ETag', entry['etag'])
+        # Clients may cache but must revalidate, which costs a 304 while the data version is unchanged
+        self.set_header('Cache-Control', 'no-cache')
+        if self.check_etag_header():
+            self.set_status(304)
+            return
+        self.set_header('Content-Type', 'application/json')
+        self.write(entry['body'])
+
+    def compute_etag(self):
+        # The ETag is set from the cache entry; skip Tornado's hashing of every response body
+        return None
+
+
+class HealthHandler(JSONHandler):
+    def initialize(self, service):
+        self.service = service
+
+    def get(self):
+        self.write({
+            'data_version': self.service.snapshot['version'],
+            'cache_entries': len(self.service.cache),
+            'cache_hits': self.service.hits,
+            'cache_misses': self.service.misses,
+        })
+
+
+def make_app(service):
+    routes = [(rf'/{endpoint}', AggregateHandler, {'service': service, 'endpoint': endpoint})
+              for endpoint in ENDPOINTS]
+    routes.append((r'/health', HealthHandler, {'service': service}))
+    return tornado.web.Application(routes)
+
+
+async def serve(port, cache_size, threads):
+    from scripts.database import get_engine
+
+    service = KPIService(get_engine(), cache_size=cache_size, threads=threads)
+    await service.refresh_snapshot()
+    make_app(service).listen(port)
+    tornado.ioloop.PeriodicCallback(service.refresh_snapshot, VERSION_CHECK_SECONDS * 1000).start()
+    print(f"KPI service listening on http://localhost:{port}")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve KPIs and aggregates over HTTP/JSON.")
+    parser.add_argument('--port', type=int, default=8600, help="Port to listen on.")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Maximum number of cached results.")
+    parser.add_argument('--threads', type=int, default=4, help="Threads computing cache misses.")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.port, args.cache_size, args.threads))
+
+
+if __name__ == "__main__":
+    main()
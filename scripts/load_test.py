@@ -0,0 +1,540 @@
+"""
+This module load-tests the dashboard with many simultaneous sessions.
+
+Each simulated session is a Streamlit AppTest running the real dashboard script
+against the database configured in .env (a local PostgreSQL). Sessions follow
+the interaction scripts in SCENARIOS: page switches, sidebar filter changes and
+campaign drill-downs with paging. By default every session runs in its own
+worker process; the memory-mapped data snapshot is still shared by all of them,
+but Streamlit's in-process caches are not, so query counts are an upper bound.
+
+The report contains p50/p95/p99 latency per interaction, the number of SQL
+queries each interaction issued (including the COPY/ADBC table loads of
+scripts.arrow_fetch; check_query_counter verifies they are counted), the number of database connections the
+sessions hold (sampled from pg_stat_activity by application_name), peak memory
+per worker process, and any worker that crashed or timed out.
+
+With --workers below --sessions, sessions run as threads inside fewer worker
+processes, as on a Streamlit server, so they also share Streamlit's caches.
+This relies on a patch of Streamlit's private Runtime (see share_test_runtime),
+is only enabled for the pinned Streamlit version, and can lose a script run's
+output under contention; such runs are reported as errors.
+
+Usage (from the project root):
+    python -m scripts.load_test [--seed] [--sessions 20] [--workers N] [--iterations 3]
+                                [--max-p95 5.0] [--output load_test.json]
+
+--seed runs the data pipeline (generate_data, cleaning, upload, ...) first.
+Exits with status 1 when a worker fails or the overall p95 latency exceeds --max-p95 seconds.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+APP_PATH = os.path.join(PROJECT_ROOT, 'dashboard', 'streamlit_app.py')
+
+# Session-state key used to attribute SQL queries to a simulated session
+SESSION_KEY = '_load_test_session'
+# application_name of the workers' database connections (libpq reads PGAPPNAME)
+APPLICATION_NAME = 'bi_load_test'
+# Streamlit version share_test_runtime is verified against (see requirements.txt)
+SHARED_RUNTIME_STREAMLIT_VERSION = '1.41.1'
+
+SCENARIOS = {
+    'browse': [
+        ('page', 'Reports'),
+        ('page', 'KPIs'),
+        ('page', 'Cohorts'),
+        ('page', 'Home'),
+    ],
+    'filter': [
+        ('page', 'Reports'),
+        ('date_range', None),
+        ('multiselect', 'segments'),
+        ('multiselect', 'products'),
+        ('multiselect', 'campaigns'),
+        ('reset_filters', None),
+    ],
+    'drill_down': [
+        ('page', 'Reports'),
+        ('drill_campaign', None),
+        ('next_page', None),
+        ('next_page', None),
+        ('drill_campaign', None),
+    ],
+    'predict': [
+        ('page', 'Predictive Analysis'),
+        ('page', 'Home'),
+    ],
+}
+
+# Relative frequency of each scenario among simulated sessions
+SCENARIO_WEIGHTS = {'browse': 3, 'filter': 3, 'drill_down': 3, 'predict': 1}
+
+_query_counts = defaultdict(int)
+_query_lock = threading.Lock()
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None or SESSION_KEY not in ctx.session_state:
+        return
+    with _query_lock:
+        _query_counts[ctx.session_state[SESSION_KEY]] += 1
+
+
+def install_query_counter():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    event.listen(Engine, 'before_cursor_execute', _count_query)
+
+
+def check_query_counter():
+    """
+    Fails if the full-table loads of scripts.arrow_fetch (COPY or ADBC on a DBAPI
+    cursor) would not reach the before_cursor_execute event the query counter uses.
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from scripts.arrow_fetch import fetch_arrow_table
+
+    query = "SELECT 1 AS load_test_probe"
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', listener)
+    try:
+        fetch_arrow_table(query)
+    finally:
+        event.remove(Engine, 'before_cursor_execute', listener)
+    # The LIMIT 0 column probe does not count; the fetch itself must be seen
+    if not any(query in statement and 'LIMIT 0' not in statement for statement in statements):
+        raise RuntimeError("Table loads through scripts.arrow_fetch are not counted as queries.")
+
+
+def can_share_runtime():
+    import streamlit
+    return streamlit.__version__ == SHARED_RUNTIME_STREAMLIT_VERSION
+
+
+def share_test_runtime():
+    """
+    AppTest installs a mock Streamlit Runtime for each script run and clears it
+    when the run ends, which breaks runs of other sessions in the same process.
+    Keep the most recent mock available so sessions can run side by side, as
+    they do on a Streamlit server. This patches private Runtime attributes, so it
+    is only applied to the Streamlit version it was verified against.
+    """
+    import streamlit
+    from streamlit.runtime import Runtime
+    if not can_share_runtime():
+        raise RuntimeError(f"share_test_runtime supports Streamlit {SHARED_RUNTIME_STREAMLIT_VERSION}, "
+                           f"found {streamlit.__version__}; run one session per process instead.")
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last['runtime']
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or 'runtime' in last)
+
+
+def order_date_range():
+    """
+    Returns the (first, last) order date in sales, so date filters select windows
+    that hold data, or None if sales cannot be read (date_range steps are then skipped).
+    """
+    import pandas as pd
+    from scripts.database import get_engine
+    try:
+        bounds = pd.read_sql("SELECT MIN(order_date) AS first, MAX(order_date) AS last FROM sales",
+                             get_engine()).iloc[0]
+    except Exception as e:
+        print(f"Could not read the order date range ({e}); date filter steps are skipped.")
+        return None
+    if pd.isnull(bounds['first']) or pd.isnull(bounds['last']):
+        return None
+    return pd.Timestamp(bounds['first']).date(), pd.Timestamp(bounds['last']).date()
+
+
+def _widget(at, kind, key):
+    try:
+        return getattr(at, kind)(key=key)
+    except KeyError:
+        return None
+
+
+def apply_step(at, step, rng, order_dates=None):
+    """
+    Performs one interaction on an AppTest and reruns the script.
+    Returns False when the step does not apply to the current page (it is then not timed).
+    order_dates is the (first, last) order date date_range windows are drawn from.
+    """
+    action, argument = step
+    if action == 'page':
+        at.radio(key='page').set_value(argument)
+    elif action == 'date_range':
+        start = _widget(at, 'date_input', 'start_date')
+        end = _widget(at, 'date_input', 'end_date')
+        if start is None or end is None or order_dates is None:
+            return False
+        data_start, data_end = order_dates
+        first = data_start + timedelta(days=rng.randint(0, max((data_end - data_start).days - 7, 0)))
+        start.set_value(first)
+        end.set_value(min(first + timedelta(days=rng.randint(7, 90)), data_end))
+    elif action == 'multiselect':
+        widget = _widget(at, 'multiselect', argument)
+        if widget is None or len(widget.options) < 2:
+            return False
+        options = [option for option in widget.options if option != 'All']
+        widget.set_value(rng.sample(options, k=min(len(options), rng.randint(1, 2))))
+    elif action == 'reset_filters':
+        for key in ('products', 'segments', 'campaigns'):
+            widget = _widget(at, 'multiselect', key)
+            if widget is not None:
+                widget.set_value(['All'])
+        for key in ('start_date', 'end_date'):
+            widget = _widget(at, 'date_input', key)
+            if widget is not None:
+                widget.set_value(None)
+    elif action == 'drill_campaign':
+        widget = _widget(at, 'selectbox', 'drill_campaign')
+        if widget is None or not widget.options:
+            return False
+        widget.set_value(rng.choice(widget.options))
+    elif action == 'next_page':
+        button = _widget(at, 'button', 'drill_next')
+        if button is None or button.disabled:
+            return False
+        button.click()
+    else:
+        raise ValueError(f"Unknown load-test action: {action}")
+    at.run()
+    return True
+
+
+def run_session(session_name, scenario_names, iterations, seed, timeout, records, order_dates=None):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.session_state[SESSION_KEY] = session_name
+
+    def timed(label, scenario, perform):
+        with _query_lock:
+            queries_before = _query_counts[session_name]
+        start = time.perf_counter()
+        error = None
+        try:
+            if perform() is False:
+                return
+            if at.exception:
+                error = str(at.exception[0].value)[:200]
+            elif not len(at.radio):
+                # Every page draws the page selector, so its absence means the run's output was lost
+                error = "Incomplete script run: the page selector was not rendered."
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:200]
+        seconds = time.perf_counter() - start
+        with _query_lock:
+            queries = _query_counts[session_name] - queries_before
+        records.append({'session': session_name, 'scenario': scenario, 'action': label,
+                        'seconds': seconds, 'queries': queries, 'error': error})
+
+    timed('open', None, at.run)
+    for _ in range(iterations):
+        scenario = rng.choices(scenario_names, weights=[SCENARIO_WEIGHTS.get(s, 1) for s in scenario_names])[0]
+        for step in SCENARIOS[scenario]:
+            label = step[0] if step[0] != 'page' else f"page:{step[1]}"
+            timed(label, scenario, lambda: apply_step(at, step, rng, order_dates))
+
+
+def run_worker(worker_id, sessions, scenario_names, iterations, seed, timeout, start_event, result_queue,
+               order_dates=None):
+    """
+    Entry point of a worker process: runs its share of sessions as threads.
+    """
+    os.chdir(PROJECT_ROOT)
+    os.environ['PGAPPNAME'] = APPLICATION_NAME
+    install_query_counter()
+    if sessions > 1:
+        share_test_runtime()
+    records = []
+    threads = [
+        threading.Thread(target=run_session,
+                         args=(f"w{worker_id}-s{i}", scenario_names, iterations,
+                               seed * 1000 + worker_id * 100 + i, timeout, records, order_dates))
+        for i in range(sessions)
+    ]
+    start_event.wait()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result_queue.put((worker_id, records))
+
+
+class ResourceMonitor(threading.Thread):
+    """
+    Samples database connections and worker memory while the load test runs.
+    """
+
+    def __init__(self, pids, interval=0.5):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.connections = []
+        self.memory = {pid: {'peak_rss_mb': 0.0, 'peak_uss_mb': 0.0} for pid in pids}
+
+    def run(self):
+        import psutil
+        from sqlalchemy import text
+        from scripts.database import get_engine
+
+        processes = {pid: psutil.Process(pid) for pid in self.pids}
+        conn = None
+        try:
+            conn = get_engine().connect()
+        except Exception as e:
+            print(f"Could not connect to sample pg_stat_activity; sampling memory only: {e}")
+        try:
+            while not self.stop_event.is_set():
+                if conn is not None:
+                    try:
+                        in_use = conn.execute(text(
+                            "SELECT COUNT(*) FROM pg_stat_activity "
+                            "WHERE datname = current_database() AND application_name = :application_name"
+                        ), {'application_name': APPLICATION_NAME}).scalar()
+                        self.connections.append(int(in_use))
+                    except Exception as e:
+                        print(f"Could not sample pg_stat_activity: {e}")
+                for pid, process in processes.items():
+                    try:
+                        info = process.memory_full_info()
+                    except psutil.Error:
+                        continue
+                    entry = self.memory[pid]
+                    entry['peak_rss_mb'] = max(entry['peak_rss_mb'], info.rss / 2 ** 20)
+                    entry['peak_uss_mb'] = max(entry['peak_uss_mb'], info.uss / 2 ** 20)
+                self.stop_event.wait(self.interval)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+
+def summarize(records):
+    """
+    Aggregates interaction records into latency percentiles and queries per interaction.
+    """
+    def stats(rows):
+        seconds = np.array([row['seconds'] for row in rows])
+        queries = np.array([row['queries'] for row in rows])
+        return {
+            'interactions': len(rows),
+            'errors': sum(1 for row in rows if row['error']),
+            'p50_seconds': float(np.percentile(seconds, 50)),
+            'p95_seconds': float(np.percentile(seconds, 95)),
+            'p99_seconds': float(np.percentile(seconds, 99)),
+            'max_seconds': float(seconds.max()),
+            'mean_queries': float(queries.mean()),
+            'max_queries': int(queries.max()),
+        }
+
+    by_action = defaultdict(list)
+    for row in records:
+        by_action[row['action']].append(row)
+    return {
+        'overall': stats(records) if records else {},
+        'by_action': {action: stats(rows) for action, rows in sorted(by_action.items())},
+    }
+
+
+def _collect_results(processes, result_queue, deadline):
+    """
+    Gathers the records of every worker. A worker that exits without reporting or
+    is still running at the deadline is reported as failed instead of blocking forever.
+    """
+    records, failed = [], []
+    pending = dict(processes)
+    while pending:
+        try:
+            worker_id, worker_records = result_queue.get(timeout=1.0)
+            records.extend(worker_records)
+            pending.pop(worker_id, None)
+            continue
+        except queue.Empty:
+            pass
+        exited = [worker_id for worker_id, process in pending.items() if process.exitcode is not None]
+        if exited:
+            # A result sent just before exiting may still be in the queue
+            try:
+                while True:
+                    worker_id, worker_records = result_queue.get(timeout=0.5)
+                    records.extend(worker_records)
+                    pending.pop(worker_id, None)
+            except queue.Empty:
+                pass
+            for worker_id in exited:
+                if worker_id in pending:
+                    failed.append({'worker': worker_id, 'exitcode': pending.pop(worker_id).exitcode,
+                                   'reason': 'exited without results'})
+        if time.perf_counter() > deadline:
+            for worker_id, process in pending.items():
+                process.terminate()
+                failed.append({'worker': worker_id, 'exitcode': None, 'reason': 'timed out'})
+            pending.clear()
+    return records, failed
+
+
+def run_load_test(sessions=20, workers=None, iterations=3, scenarios=None, seed=0, timeout=120):
+    """
+    Runs the load test and returns the report.
+
+    Parameters:
+    - sessions: Total number of simulated sessions.
+    - workers: Number of worker processes the sessions are spread over (default: one per session).
+      Fewer workers than sessions needs the Streamlit version share_test_runtime supports.
+    - iterations: Scenarios each session plays after opening the dashboard.
+    - scenarios: Scenario names to draw from (default: all of SCENARIOS).
+    - timeout: Per-interaction timeout (s); a worker is given the time of every interaction of one session.
+    """
+    scenario_names = scenarios or list(SCENARIOS)
+    workers = min(workers or sessions, sessions)
+    if not can_share_runtime() and workers < sessions:
+        import streamlit
+        print(f"Streamlit {streamlit.__version__} is not {SHARED_RUNTIME_STREAMLIT_VERSION}; "
+              f"running each of the {sessions} sessions in its own process.")
+        workers = sessions
+    order_dates = order_date_range()
+    if order_dates is not None:
+        check_query_counter()
+    context = multiprocessing.get_context('spawn')
+    start_event = context.Event()
+    result_queue = context.Queue()
+    per_worker = [sessions // workers + (1 if i < sessions % workers else 0) for i in range(workers)]
+    processes = {
+        i: context.Process(target=run_worker,
+                           args=(i, count, scenario_names, iterations, seed, timeout, start_event, result_queue,
+                                 order_dates))
+        for i, count in enumerate(per_worker) if count
+    }
+    for process in processes.values():
+        process.start()
+
+    monitor = ResourceMonitor([process.pid for process in processes.values()])
+    monitor.start()
+    start = time.perf_counter()
+    start_event.set()
+    max_steps = max(len(SCENARIOS[name]) for name in scenario_names)
+    deadline = start + timeout * (1 + iterations * max_steps)
+    records, failed_workers = _collect_results(processes, result_queue, deadline)
+    elapsed = time.perf_counter() - start
+    for process in processes.values():
+        process.join()
+    monitor.stop()
+
+    report = summarize(records)
+    report['config'] = {'sessions': sessions, 'workers': len(processes), 'iterations': iterations,
+                        'scenarios': scenario_names, 'seed': seed}
+    report['wall_seconds'] = elapsed
+    report['interactions_per_second'] = len(records) / elapsed if elapsed else 0.0
+    report['db_connections'] = {
+        'peak': max(monitor.connections, default=0),
+        'mean': float(np.mean(monitor.connections)) if monitor.connections else 0.0,
+    }
+    report['worker_memory'] = [
+        {'worker': i, 'pid': process.pid, **monitor.memory[process.pid]} for i, process in processes.items()
+    ]
+    report['failed_workers'] = failed_workers
+    report['errors'] = [row for row in records if row['error']][:20]
+    return report
+
+
+def print_report(report):
+    config = report['config']
+    print(f"{config['sessions']} sessions on {config['workers']} worker(s), "
+          f"{config['iterations']} scenario(s) each, {report['wall_seconds']:.1f}s wall, "
+          f"{report['interactions_per_second']:.1f} interactions/s")
+    overall = report['overall']
+    if overall:
+        print(f"Latency p50 {overall['p50_seconds']:.2f}s  p95 {overall['p95_seconds']:.2f}s  "
+              f"p99 {overall['p99_seconds']:.2f}s  ({overall['interactions']} interactions, "
+              f"{overall['errors']} errors)")
+    print(f"DB connections in use: peak {report['db_connections']['peak']}, "
+          f"mean {report['db_connections']['mean']:.1f}")
+    for entry in report['worker_memory']:
+        print(f"Worker {entry['worker']} (pid {entry['pid']}): peak RSS {entry['peak_rss_mb']:.0f} MB, "
+              f"peak USS {entry['peak_uss_mb']:.0f} MB")
+
+    print(f"\n{'Interaction':<25}{'count':>7}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'queries':>9}{'errors':>8}")
+    for action, entry in report['by_action'].items():
+        print(f"{action:<25}{entry['interactions']:>7}{entry['p50_seconds']:>8.2f}{entry['p95_seconds']:>8.2f}"
+              f"{entry['p99_seconds']:>8.2f}{entry['mean_queries']:>9.1f}{entry['errors']:>8}")
+    for error in report['errors'][:5]:
+        print(f"Error in {error['session']} ({error['action']}): {error['error']}")
+    for failure in report['failed_workers']:
+        print(f"Worker {failure['worker']} failed ({failure['reason']}, exit code {failure['exitcode']}).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the dashboard with simulated concurrent sessions.")
+    parser.add_argument('--seed', action='store_true', help="Run the data pipeline before the test.")
+    parser.add_argument('--sessions', type=int, default=20, help="Number of simulated sessions.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes (default: one per session).")
+    parser.add_argument('--iterations', type=int, default=3, help="Scenarios played by each session.")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), help="Only play these scenarios.")
+    parser.add_argument('--random-seed', type=int, default=0, help="Seed for the interaction choices.")
+    parser.add_argument('--timeout', type=int, default=120, help="Per-interaction timeout (s).")
+    parser.add_argument('--max-p95', type=float, default=None, help="Fail if overall p95 latency exceeds this (s).")
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path.")
+    args = parser.parse_args()
+
+    if args.seed:
+        from scripts.pipeline import run_pipeline
+        report = run_pipeline()
+        if any(entry['status'] in ('failed', 'blocked') for entry in report.values()):
+            print("Seeding the database failed; aborting the load test.")
+            exit(1)
+
+    report = run_load_test(sessions=args.sessions, workers=args.workers, iterations=args.iterations,
+                           scenarios=args.scenarios, seed=args.random_seed, timeout=args.timeout)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nReport written to {args.output}.")
+
+    if report['failed_workers']:
+        exit(1)
+    p95 = report['overall'].get('p95_seconds', 0.0)
+    if args.max_p95 is not None and p95 > args.max_p95:
+        print(f"p95 latency budget exceeded: {p95:.2f}s > {args.max_p95:.2f}s")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+This module runs the data pipeline scripts (see STAGES) as a DAG.
+Each stage declares its input and output files and tables. A stage is skipped
+when the content hash of its inputs, its own script and the scripts.* modules it
+imports is unchanged since its last successful run, and its output files and
+tables still exist. Completed stages are checkpointed after each success, so a
+failed run resumes from the failed stage on the next invocation.
+
+Incremental stages (cohort_analysis, approximate_queries, anomaly_detection)
+only process new data by default. They are run with --full when an upstream
+stage has run since their last success, because upstream data may then have
+changed for days they already processed.
+
+Usage (from the project root):
+    python -m scripts.pipeline [--force] [--stages data_cleaning ...] [--jobs N]
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+STATE_PATH = os.path.join(PROJECT_ROOT, 'data', '.pipeline_state.json')
+
+RAW = 'data/raw'
+CLEANED = 'data/cleaned'
+
+STAGES = {
+    'generate_data': {
+        'module': 'scripts.generate_data',
+        'inputs': [],
+        'outputs': [f'{RAW}/customers.csv', f'{RAW}/sales.csv', f'{RAW}/products.csv', f'{RAW}/marketing.csv'],
+        'tables': [],
+        'depends_on': [],
+    },
+    'data_cleaning': {
+        'module': 'scripts.data_cleaning',
+        'inputs': [f'{RAW}/customers.csv', f'{RAW}/sales.csv', f'{RAW}/products.csv', f'{RAW}/marketing.csv'],
+        'outputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv',
+                    f'{CLEANED}/products_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'tables': [],
+        'depends_on': ['generate_data'],
+    },
+    'data_mapping': {
+        'module': 'scripts.data_mapping',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'outputs': [f'{CLEANED}/sales_marketing.csv'],
+        'tables': [],
+        'depends_on': ['data_cleaning'],
+    },
+    'data_upload': {
+        'module': 'scripts.data_upload',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv',
+                   f'{CLEANED}/products_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'outputs': [],
+        'tables': ['sales', 'customers', 'products', 'marketing'],
+        'depends_on': ['data_cleaning'],
+    },
+    'campaign_attribution': {
+        'module': 'scripts.campaign_attribution',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'outputs': [],
+        'tables': ['campaign_performance'],
+        'depends_on': ['data_cleaning'],
+    },
+    'approximate_queries': {
+        'module': 'scripts.approximate_queries',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv'],
+        'outputs': [],
+        'tables': ['sales_sketches', 'sales_sample'],
+        'depends_on': ['data_cleaning'],
+        'incremental': True,
+    },
+    'cohort_analysis': {
+        'module': 'scripts.cohort_analysis',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv'],
+        'outputs': [],
+        'tables': ['cohort_activity'],
+        'depends_on': ['data_upload'],
+        'incremental': True,
+    },
+    'kpi_cube': {
+        'module': 'scripts.kpi_cube',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv',
+                   f'{CLEANED}/products_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'outputs': [],
+        'tables': ['kpi_cube'],
+        'depends_on': ['data_upload'],
+    },
+    'anomaly_detection': {
+        'module': 'scripts.anomaly_detection',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv',
+                   f'{CLEANED}/products_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'outputs': [],
+        'tables': ['anomalies', 'anomaly_state'],
+        'depends_on': ['data_upload'],
+        'incremental': True,
+    },
+    'data_snapshot': {
+        'module': 'scripts.data_snapshot',
+        'inputs': [f'{CLEANED}/sales_cleaned.csv', f'{CLEANED}/customers_cleaned.csv',
+                   f'{CLEANED}/products_cleaned.csv', f'{CLEANED}/marketing_cleaned.csv'],
+        'outputs': ['data/snapshots/CURRENT'],
+        'tables': [],
+        'depends_on': ['data_upload'],
+    },
+}
+
+
+def load_state(state_path=STATE_PATH):
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            return json.load(f)
+    return {'stages': {}, 'files': {}}
+
+
+def save_state(state, state_path=STATE_PATH):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, state_path)
+
+
+def file_digest(path, file_cache):
+    """
+    Returns the sha256 of a file. Digests are cached by (size, mtime), so files
+    that were not touched since the last run are not re-read.
+    """
+    stat = os.stat(path)
+    cached = file_cache.get(path)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['sha256']
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    file_cache[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return file_cache[path]['sha256']
+
+
+def _module_path(module, root):
+    return os.path.join(root, *module.split('.')) + '.py'
+
+
+def local_imports(module, root=PROJECT_ROOT):
+    """
+    Returns the source paths of a module and of every scripts.* module it imports,
+    directly or transitively (including imports inside functions).
+    """
+    seen, pending = set(), [module]
+    while pending:
+        current = pending.pop()
+        path = _module_path(current, root)
+        if current in seen or not os.path.exists(path):
+            continue
+        seen.add(current)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names if alias.name.startswith('scripts.'))
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                if node.module == 'scripts':
+                    pending.extend(f'scripts.{alias.name}' for alias in node.names)
+                elif node.module.startswith('scripts.'):
+                    pending.append(node.module)
+    return [_module_path(name, root) for name in sorted(seen)]
+
+
+def stage_fingerprint(name, stage, file_cache, root=PROJECT_ROOT):
+    """
+    Hashes the stage's script and the local modules it imports together with
+    all of its input files. Returns None if an input is missing.
+    """
+    module_paths = local_imports(stage['module'], root)
+    if not module_paths:
+        return None
+    digest = hashlib.sha256(name.encode())
+    for path in module_paths + [os.path.join(root, p) for p in stage['inputs']]:
+        if not os.path.exists(path):
+            return None
+        digest.update(path.encode())
+        digest.update(file_digest(path, file_cache).encode())
+    return digest.hexdigest()
+
+
+def existing_tables(names):
+    """
+    Returns the subset of names that exist as tables in the database. If the
+    database cannot be reached, none are reported, so stages writing tables re-run.
+    """
+    if not names:
+        return set()
+    try:
+        from sqlalchemy import inspect
+        from scripts.database import get_engine
+        inspector = inspect(get_engine())
+        return {name for name in names if inspector.has_table(name)}
+    except Exception as e:
+        print(f"Could not check the database tables ({e}); stages writing tables will re-run.")
+        return set()
+
+
+def upstream_runs(stage, state):
+    # When each dependency last completed; a change means upstream data may have changed
+    return {dep: state['stages'].get(dep, {}).get('finished_at') for dep in stage['depends_on']}
+
+
+def needs_full_run(name, stage, state, force=False):
+    """
+    Whether an incremental stage has to reprocess everything: on --force, and
+    whenever an upstream stage has run since the stage's last success.
+    """
+    if not stage.get('incremental'):
+        return False
+    recorded = state['stages'].get(name, {})
+    return force or recorded.get('status') != 'ok' or recorded.get('upstream') != upstream_runs(stage, state)
+
+
+def is_up_to_date(name, stage, fingerprint, state, tables, root=PROJECT_ROOT):
+    recorded = state['stages'].get(name)
+    if not recorded or recorded.get('status') != 'ok' or recorded.get('fingerprint') != fingerprint:
+        return False
+    if not all(table in tables for table in stage['tables']):
+        return False
+    if stage.get('incremental') and recorded.get('upstream') != upstream_runs(stage, state):
+        return False
+    return all(os.path.exists(os.path.join(root, p)) for p in stage['outputs'])
+
+
+def run_stage(name, stage, root=PROJECT_ROOT, full=False):
+    start_wall = time.perf_counter()
+    command = [sys.executable, '-m', stage['module']] + (['--full'] if full else [])
+    result = subprocess.run(command, cwd=root, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start_wall
+    return result.returncode, elapsed, result.stdout, result.stderr
+
+
+def topological_order(stages):
+    order, visited = [], set()
+
+    def visit(name, path):
+        if name in path:
+            raise ValueError(f"Pipeline has a dependency cycle through {name}")
+        if name in visited:
+            return
+        for dep in stages[name]['depends_on']:
+            visit(dep, path | {name})
+        visited.add(name)
+        order.append(name)
+
+    for name in stages:
+        visit(name, frozenset())
+    return order
+
+
+def run_pipeline(stages=STAGES, selected=None, force=False, jobs=4, root=PROJECT_ROOT, state_path=STATE_PATH):
+    """
+    Runs the pipeline, executing independent stages in parallel.
+
+    Parameters:
+    - stages: Stage declarations (see STAGES).
+    - selected: Optional list of stage names to consider; others are treated as up to date.
+    - force: Re-run selected stages even if their fingerprint is unchanged.
+    - jobs: Maximum number of stages running at once.
+
+    Returns:
+    - report: Dict mapping stage name to its status ('ok', 'skipped', 'failed', 'blocked') and seconds.
+    """
+    state = load_state(state_path)
+    file_cache = state.setdefault('files', {})
+    order = topological_order(stages)
+    selected = set(selected or order)
+    # Tables of other stages are not rewritten by a stage, so one check per run suffices
+    tables = set() if force else existing_tables({table for name in selected for table in stages[name]['tables']})
+    report = {}
+    pending = list(order)
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            for name in list(pending):
+                deps = stages[name]['depends_on']
+                if any(report.get(dep, {}).get('status') in ('failed', 'blocked') for dep in deps):
+                    report[name] = {'status': 'blocked', 'seconds': 0.0}
+                    pending.remove(name)
+                    print(f"[blocked] {name}: an upstream stage failed")
+                    continue
+                if not all(dep in report for dep in deps):
+                    continue
+                pending.remove(name)
+
+                # Upstream outputs are final now, so the fingerprint is stable
+                fingerprint = stage_fingerprint(name, stages[name], file_cache, root)
+                if name not in selected or (not force and fingerprint and
+                                            is_up_to_date(name, stages[name], fingerprint, state, tables, root)):
+                    report[name] = {'status': 'skipped', 'seconds': 0.0}
+                    print(f"[skipped] {name}: inputs unchanged")
+                    continue
+                full = needs_full_run(name, stages[name], state, force)
+                print(f"[running] {name}{' --full' if full else ''}")
+                running[executor.submit(run_stage, name, stages[name], root, full)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                returncode, elapsed, stdout, stderr = future.result()
+                if returncode == 0:
+                    # Checkpoint after each success so a later failure does not redo this stage
+                    state['stages'][name] = {
+                        'status': 'ok',
+                        'fingerprint': stage_fingerprint(name, stages[name], file_cache, root),
+                        'seconds': round(elapsed, 3),
+                        'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    }
+                    if stages[name].get('incremental'):
+                        state['stages'][name]['upstream'] = upstream_runs(stages[name], state)
+                    for path in stages[name]['outputs']:
+                        full_path = os.path.join(root, path)
+                        if os.path.exists(full_path):
+                            file_digest(full_path, file_cache)
+                    report[name] = {'status': 'ok', 'seconds': elapsed}
+                    print(f"[ok] {name} in {elapsed:.2f}s")
+                else:
+                    state['stages'][name] = {'status': 'failed', 'seconds': round(elapsed, 3)}
+                    report[name] = {'status': 'failed', 'seconds': elapsed}
+                    print(f"[failed] {name} after {elapsed:.2f}s\n{stderr.strip()}")
+                if stdout.strip():
+                    print(stdout.strip())
+                save_state(state, state_path)
+
+    save_state(state, state_path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the BI data pipeline.")
+    parser.add_argument('--force', action='store_true', help="Re-run stages even if inputs are unchanged.")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help="Only consider these stages.")
+    parser.add_argument('--jobs', type=int, default=4, help="Maximum number of stages run in parallel.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = run_pipeline(selected=args.stages, force=args.force, jobs=args.jobs)
+    print("\nStage timings:")
+    for name, entry in report.items():
+        print(f"  {name:<15} {entry['status']:<8} {entry['seconds']:.2f}s")
+    print(f"Total: {time.perf_counter() - start:.2f}s")
+
+    if any(entry['status'] == 'failed' for entry in report.values()):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+This module is the profiling surface of the pipeline scripts (data_cleaning,
+data_mapping, data_upload). It is off by default and costs nothing when off.
+
+Enable it with --profile on a script, or with BI_PROFILE=1 in the environment
+(which also reaches scripts started by scripts/pipeline.py). --cprofile or
+BI_CPROFILE=1 additionally dumps a cProfile file per top-level stage; view one
+as a flame graph with e.g. `snakeviz` or `flameprof`.
+
+Each run writes data/profiles/<script>_<timestamp>.json (and <script>_latest.json)
+with wall time, CPU time, peak traced memory, rows in/out and rows per second per
+stage. Stage names are stable, so two reports can be compared to find the
+stage that regressed:
+    python -m scripts.profiling compare data/profiles/old.json data/profiles/new.json
+"""
+import argparse
+import cProfile
+import functools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'profiles')
+PROFILE_ENV = 'BI_PROFILE'
+CPROFILE_ENV = 'BI_CPROFILE'
+
+# Relative slowdown reported as a regression by `compare`, ignoring changes below MIN_REGRESSION_SECONDS
+REGRESSION_THRESHOLD = 0.2
+MIN_REGRESSION_SECONDS = 0.05
+
+_run = {'active': False}
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', action='store_true',
+                        help=f"Write a JSON profiling report (or set {PROFILE_ENV}=1).")
+    parser.add_argument('--cprofile', action='store_true',
+                        help=f"Also dump cProfile stats per stage (or set {CPROFILE_ENV}=1).")
+
+
+def _env_flag(name):
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+
+def is_enabled():
+    return _run['active']
+
+
+def row_count(value):
+    """
+    Rows in a DataFrame/Series, or the total over a tuple or list of DataFrames; None otherwise.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, (tuple, list)) and value and all(isinstance(v, pd.DataFrame) for v in value):
+        return sum(len(v) for v in value)
+    return None
+
+
+@contextmanager
+def run(script, args=None, output_dir=PROFILE_DIR):
+    """
+    Profiles a whole script run and writes its report on exit.
+    Enabled by args.profile / args.cprofile or the BI_PROFILE / BI_CPROFILE environment variables.
+    """
+    cprofile = bool(getattr(args, 'cprofile', False)) or _env_flag(CPROFILE_ENV)
+    enabled = bool(getattr(args, 'profile', False)) or _env_flag(PROFILE_ENV) or cprofile
+    if not enabled:
+        yield
+        return
+
+    started_at = time.strftime('%Y%m%dT%H%M%S')
+    os.makedirs(output_dir, exist_ok=True)
+    _run.update(active=True, script=script, cprofile=cprofile, stages={}, stack=[],
+                dump_prefix=os.path.join(output_dir, f'{script}_{started_at}'))
+    tracing_before = tracemalloc.is_tracing()
+    if not tracing_before:
+        tracemalloc.start()
+    status = 'ok'
+    try:
+        with stage('total', root=True):
+            yield
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        report = {
+            'script': script,
+            'started_at': started_at,
+            'status': status,
+            'python': platform.python_version(),
+            'host': platform.node(),
+            'argv': sys.argv[1:],
+            'stages': list(_run['stages'].values()),
+        }
+        if not tracing_before:
+            tracemalloc.stop()
+        _run.update(active=False)
+        path = os.path.join(output_dir, f'{script}_{started_at}.json')
+        for target in (path, os.path.join(output_dir, f'{script}_latest.json')):
+            with open(target, 'w') as f:
+                json.dump(report, f, indent=2)
+        print(f"Profiling report written to {path}.")
+
+
+class StageRecord:
+    """
+    Lets the body of a stage report its row counts.
+    """
+
+    def __init__(self, rows_in=None):
+        self.rows_in = rows_in
+        self.rows_out = None
+
+
+@contextmanager
+def stage(name, rows_in=None, root=False):
+    """
+    Times a named block. Nested stages are reported as 'outer/inner'; repeated
+    stages with the same path are accumulated and counted in 'calls'.
+    """
+    record = StageRecord(rows_in)
+    if not _run['active']:
+        yield record
+        return
+
+    stack = _run['stack']
+    path = stack[-1]['prefix'] + name if stack else name
+    # Peaks seen so far belong to the enclosing stages; then measure this stage alone
+    peak = tracemalloc.get_traced_memory()[1]
+    for entry in stack:
+        entry['peak'] = max(entry['peak'], peak)
+    tracemalloc.reset_peak()
+    # Stages directly under the whole-run stage are not prefixed with it
+    frame = {'path': path, 'prefix': '' if root else path + '/', 'peak': 0}
+    _stage_entry(path, len(stack))
+    stack.append(frame)
+
+    profiler = None
+    if _run['cprofile'] and len(stack) == 2:
+        # Only top-level stages are profiled; cProfile cannot nest
+        profiler = cProfile.Profile()
+        profiler.enable()
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(f"{_run['dump_prefix']}.{path.replace('/', '.')}.prof")
+        stack.pop()
+        frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+        tracemalloc.reset_peak()
+        _record_stage(path, len(stack), wall, cpu, frame['peak'], record)
+
+
+def _stage_entry(path, depth):
+    # Created when a stage starts, so the report lists stages in start order
+    return _run['stages'].setdefault(path, {
+        'stage': path, 'depth': depth, 'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+        'peak_memory_mb': 0.0, 'rows_in': None, 'rows_out': None, 'rows_per_second': None,
+    })
+
+
+def _record_stage(path, depth, wall, cpu, peak, record):
+    entry = _stage_entry(path, depth)
+    entry['calls'] += 1
+    entry['wall_seconds'] += wall
+    entry['cpu_seconds'] += cpu
+    entry['peak_memory_mb'] = max(entry['peak_memory_mb'], peak / 2 ** 20)
+    for field in ('rows_in', 'rows_out'):
+        value = getattr(record, field)
+        if value is not None:
+            entry[field] = (entry[field] or 0) + int(value)
+    rows = entry['rows_in'] if entry['rows_in'] is not None else entry['rows_out']
+    if rows is not None and entry['wall_seconds'] > 0:
+        entry['rows_per_second'] = rows / entry['wall_seconds']
+
+
+def profiled(name=None):
+    """
+    Decorator recording a function as a stage. Rows in are counted from its first
+    DataFrame argument and rows out from a returned DataFrame (or tuple of them).
+    """
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _run['active']:
+                return func(*args, **kwargs)
+            rows_in = next((row_count(arg) for arg in args if row_count(arg) is not None), None)
+            with stage(stage_name, rows_in=rows_in) as record:
+                result = func(*args, **kwargs)
+                record.rows_out = row_count(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def compare_reports(old_report, new_report, threshold=REGRESSION_THRESHOLD):
+    """
+    Matches stages by path and returns per-stage wall time and memory changes,
+    flagging stages that got slower by more than threshold (relative).
+    """
+    old_stages = {entry['stage']: entry for entry in old_report['stages']}
+    rows = []
+    for entry in new_report['stages']:
+        old = old_stages.get(entry['stage'])
+        if old is None:
+            rows.append({'stage': entry['stage'], 'status': 'new', 'new_wall_seconds': entry['wall_seconds']})
+            continue
+        change = (entry['wall_seconds'] - old['wall_seconds']) / old['wall_seconds'] if old['wall_seconds'] else 0.0
+        rows.append({
+            'stage': entry['stage'],
+            'status': ('regressed' if change > threshold and
+                       entry['wall_seconds'] - old['wall_seconds'] > MIN_REGRESSION_SECONDS else 'ok'),
+            'old_wall_seconds': old['wall_seconds'],
+            'new_wall_seconds': entry['wall_seconds'],
+            'wall_change': change,
+            'old_peak_memory_mb': old['peak_memory_mb'],
+            'new_peak_memory_mb': entry['peak_memory_mb'],
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two profiling reports.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    compare = subparsers.add_parser('compare', help="Show per-stage changes between two reports.")
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                         help="Relative wall-time increase reported as a regression.")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old_report = json.load(f)
+    with open(args.new) as f:
+        new_report = json.load(f)
+    rows = compare_reports(old_report, new_report, args.threshold)
+
+    print(f"{'Stage':<45}{'old s':>9}{'new s':>9}{'change':>9}{'old MB':>9}{'new MB':>9}")
+    for row in rows:
+        if row['status'] == 'new':
+            print(f"{row['stage']:<45}{'':>9}{row['new_wall_seconds']:>9.3f}{'new':>9}")
+            continue
+        flag = '  <- regressed' if row['status'] == 'regressed' else ''
+        print(f"{row['stage']:<45}{row['old_wall_seconds']:>9.3f}{row['new_wall_seconds']:>9.3f}"
+              f"{row['wall_change']:>+9.0%}{row['old_peak_memory_mb']:>9.1f}{row['new_peak_memory_mb']:>9.1f}{flag}")
+    if any(row['status'] == 'regressed' for row in rows):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
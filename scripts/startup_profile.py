@@ -0,0 +1,131 @@
+"""
+This module measures the dashboard's cold start in a fresh Python process:
+- an import-time breakdown per top-level package (python -X importtime), and
+- the time to first render of a page (one full script run via Streamlit's AppTest).
+
+Usage (from the project root):
+    python -m scripts.startup_profile [--page Home] [--budget 3.0] [--output startup.json]
+
+Exits with status 1 when the time to first render exceeds --budget seconds.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+APP_PATH = os.path.join(PROJECT_ROOT, 'dashboard', 'streamlit_app.py')
+
+# Modules whose presence after first render indicates an eager import
+HEAVY_MODULES = ['sklearn', 'plotly.express', 'sqlalchemy', 'psycopg2', 'scipy']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+harness_loaded = time.perf_counter()
+at = AppTest.from_file({app_path!r}, default_timeout={timeout})
+at.session_state['page'] = {page!r}
+at.run()
+rendered = time.perf_counter()
+print(json.dumps({{
+    'harness_import_seconds': harness_loaded - start,
+    'first_run_seconds': rendered - harness_loaded,
+    'time_to_first_render_seconds': rendered - start,
+    'exceptions': [str(e.value) for e in at.exception],
+    'heavy_modules_loaded': [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Aggregates `python -X importtime` output.
+
+    Returns:
+    - packages: Per top-level package self time (seconds), sorted descending.
+    - top_level: Directly imported modules with their cumulative time, sorted descending.
+    """
+    self_us = defaultdict(int)
+    top_level = []
+    for line in stderr.splitlines():
+        # "import time:       123 |       4567 |   package.module"
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_part, cumulative_part, name = line.split(':', 1)[1].split('|', 2)
+            self_time, cumulative_time = int(self_part), int(cumulative_part)
+        except ValueError:
+            continue
+        module = name.strip()
+        self_us[module.split('.')[0]] += self_time
+        # Nested imports are indented by two spaces per level
+        if len(name) - len(name.lstrip()) <= 1:
+            top_level.append({'module': module, 'cumulative_seconds': cumulative_time / 1e6})
+
+    packages = [{'package': package, 'self_seconds': total / 1e6} for package, total in self_us.items()]
+    packages.sort(key=lambda p: p['self_seconds'], reverse=True)
+    top_level.sort(key=lambda m: m['cumulative_seconds'], reverse=True)
+    return packages, top_level
+
+
+def profile_startup(page="Home", timeout=120):
+    """
+    Runs the dashboard once in a fresh interpreter and returns the startup report.
+    """
+    probe = PROBE.format(app_path=APP_PATH, timeout=timeout, page=page, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, timeout=timeout + 30)
+    json_lines = [line for line in result.stdout.splitlines() if line.startswith('{')]
+    if result.returncode != 0 or not json_lines:
+        raise RuntimeError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+
+    report = json.loads(json_lines[-1])
+    packages, top_level = parse_importtime(result.stderr)
+    report['page'] = page
+    report['import_seconds_by_package'] = packages
+    report['top_level_imports'] = top_level
+    return report
+
+
+def print_report(report, top=15):
+    print(f"Page: {report['page']}")
+    print(f"Time to first render: {report['time_to_first_render_seconds']:.2f}s "
+          f"(harness import {report['harness_import_seconds']:.2f}s, "
+          f"first script run {report['first_run_seconds']:.2f}s)")
+    print(f"Heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+    if report['exceptions']:
+        print(f"Exceptions during first render: {report['exceptions']}")
+    print("\nImport time by package (self):")
+    for entry in report['import_seconds_by_package'][:top]:
+        print(f"  {entry['package']:<25} {entry['self_seconds'] * 1000:8.1f} ms")
+    print("\nSlowest direct imports (cumulative):")
+    for entry in report['top_level_imports'][:top]:
+        print(f"  {entry['module']:<40} {entry['cumulative_seconds'] * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile dashboard cold start.")
+    parser.add_argument('--page', default="Home", help="Page to render first.")
+    parser.add_argument('--budget', type=float, default=None, help="Fail if time to first render exceeds this (s).")
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path.")
+    parser.add_argument('--top', type=int, default=15, help="Number of entries to print per section.")
+    args = parser.parse_args()
+
+    report = profile_startup(page=args.page)
+    print_report(report, top=args.top)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}.")
+
+    if args.budget is not None and report['time_to_first_render_seconds'] > args.budget:
+        print(f"Startup budget exceeded: {report['time_to_first_render_seconds']:.2f}s > {args.budget:.2f}s")
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()